@@ -0,0 +1,41 @@
+from fastapi import Header, HTTPException
+import threading
+
+from api import storage
+from api.sessions import get_session
+
+# -------------------------------------------------
+# Authentication resolver
+# -------------------------------------------------
+# Keeps an api_key -> user index built from the resident users collection.
+# The index is rebuilt only when the users collection changes (add_user,
+# logout rotating a key, out-of-band edits); sessions are already keyed by
+# api_key so they are looked up directly, expired ones being dropped. Each request is resolved once by
+# `resolve_auth` and FastAPI's per-request dependency cache shares the result
+# with every verify_* dependency.
+
+_index_lock = threading.Lock()
+_index = {"version": None, "users": {}}
+
+
+def _users_by_api_key():
+    users_version = storage.version("users")
+    if _index["version"] == users_version:
+        return _index["users"]
+    with _index_lock:
+        if _index["version"] != users_version:
+            users = storage.read("users")
+            _index["users"] = {u.get("api_key"): u for u in users.values() if u.get("api_key")}
+            _index["version"] = users_version
+    return _index["users"]
+
+def find_user_by_api_key(api_key):
+    return _users_by_api_key().get(api_key)
+
+def resolve_auth(x_api_key: str = Header(...)):
+    """Resolve the caller once per request: {"api_key", "user", "session", "role"}."""
+    user = find_user_by_api_key(x_api_key)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid API Key")
+    session = get_session(x_api_key)
+    return {"api_key": x_api_key, "user": user, "session": session, "role": user.get("role")}
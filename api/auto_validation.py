@@ -0,0 +1,125 @@
+from datetime import date, timedelta
+import heapq, logging, threading
+
+from api import storage
+from api.derived_index import DerivedIndex
+from api.report_query import parse_day
+from api.settings import section
+
+# -------------------------------------------------
+# Automatic validation of old report days
+# -------------------------------------------------
+# Days still unvalidated `after_days` days after their date are validated by
+# the system (validated_by 0). Instead of scanning every report file, the
+# unvalidated days are kept in a min-heap ordered by date: a run pops the days
+# that crossed the threshold and rewrites only the users owning one of them,
+# once per user. Stale users (api/derived_index.py) are re-indexed before each
+# run. Indexing a user walks the resident copy of their reports (loaded at
+# startup by the other indexes too) and skips validated days without parsing
+# their dates.
+
+_settings = section("validation")
+VALIDATE_AFTER_DAYS = _settings.get("after_days", 30)
+INTERVAL_SECONDS = _settings.get("interval_seconds", 3600)
+SYSTEM_VALIDATOR_ID = 0
+
+logger = logging.getLogger("api.auto_validation")
+
+_lock = threading.RLock()
+_heap = []           # (date, user_id, day), stale entries are skipped when popped
+_pending = {}        # user_id -> {day: date} of the unvalidated days
+
+
+def rebuild():
+    """Index the unvalidated days of every user; returns how many there are."""
+    with _lock:
+        _heap.clear()
+        _pending.clear()
+        _users.rebuild()
+        return sum(len(days) for days in _pending.values())
+
+def due(today=None):
+    """Number of indexed days that the next run would validate."""
+    cutoff = _cutoff(today)
+    with _lock:
+        return sum(1 for days in _pending.values() for d in days.values() if d <= cutoff)
+
+def run(today=None):
+    """Validate the days older than the threshold; returns {user_id: [days]} of what changed."""
+    cutoff = _cutoff(today)
+    with _lock:
+        _users.refresh_stale()
+        batches = {}
+        while _heap and _heap[0][0] <= cutoff:
+            day_date, user_id, day = heapq.heappop(_heap)
+            if _pending.get(user_id, {}).get(day) == day_date:
+                batches.setdefault(user_id, []).append(day)
+
+    validated = {}
+    for user_id, days in batches.items():
+        items = storage.read("reports", user_id).get("items", {})
+        days = [day for day in days if day in items and not items[day].get("validated")]
+        if not days:
+            continue
+        try:
+            storage.put_days(user_id, days, True, SYSTEM_VALIDATOR_ID)
+        except Exception:
+            logger.exception("Could not validate %d day(s) of user %s", len(days), user_id)
+            with _lock:
+                _users.index_user(user_id)
+            continue
+        validated[user_id] = days
+
+    if validated:
+        logger.info("Validated %d day(s) of %d user(s) up to %s", sum(map(len, validated.values())), len(validated), cutoff)
+    return validated
+
+def _cutoff(today=None):
+    return (today or date.today()) - timedelta(days=VALIDATE_AFTER_DAYS)
+
+def _track(user_id, day, day_date):
+    days = _pending.setdefault(user_id, {})
+    if days.get(day) != day_date:
+        days[day] = day_date
+        heapq.heappush(_heap, (day_date, user_id, day))
+
+def _untrack(user_id, day):
+    # The heap entry goes stale and is dropped when popped
+    _pending.get(user_id, {}).pop(day, None)
+
+def _forget_user(user_id):
+    _pending.pop(user_id, None)
+
+def _index_user(user_id):
+    unvalidated = {}
+    for day, day_report in storage.read("reports", user_id).get("items", {}).items():
+        # Validated history is skipped without parsing its date
+        if day_report.get("validated"):
+            continue
+        if (day_date := parse_day(day)) is not None:
+            unvalidated[day] = day_date
+    for day in set(_pending.get(user_id, {})) - set(unvalidated):
+        _untrack(user_id, day)
+    for day, day_date in unvalidated.items():
+        _track(user_id, day, day_date)
+    _compact()
+
+def _compact():
+    # Re-heapify once stale entries outnumber live ones
+    live = sum(len(days) for days in _pending.values())
+    if len(_heap) > 2 * live + 64:
+        _heap[:] = [(d, user_id, day) for user_id, days in _pending.items() for day, d in days.items()]
+        heapq.heapify(_heap)
+
+def _apply(event, user_id, day, record):
+    if event == "put_record":
+        day_report = storage.read("reports", user_id).get("items", {}).get(day, {})
+        if not day_report.get("validated") and (day_date := parse_day(day)) is not None:
+            _track(user_id, day, day_date)
+    elif event == "put_day":
+        if record.get("validated"):
+            _untrack(user_id, day)
+        elif (day_date := parse_day(day)) is not None:
+            _track(user_id, day, day_date)
+
+_users = DerivedIndex(_lock, _index_user, _forget_user, _apply)
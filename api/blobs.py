@@ -0,0 +1,91 @@
+from pathlib import Path
+import logging, os
+
+from api import previews
+from api.locks import file_lock
+from api.settings import section
+from api.storage import DATABASE_DIR
+
+# -------------------------------------------------
+# Content-addressed attachment store
+# -------------------------------------------------
+# Attachments are stored once per content under
+#   database/files/blobs/<sha256[:2]>/<sha256>.<ext>
+# Every file entry referencing a blob owns a reference marker
+#   database/files/blobs/<sha256[:2]>/<sha256>.refs/<file id>
+# Adding or dropping a reference is a single file create/unlink, safe across
+# processes and crashes. Blobs left without references are removed by the
+# background garbage collection pass (collect_garbage), with their previews.
+
+BLOBS_DIR = DATABASE_DIR.joinpath("files", "blobs")
+LOCK_FILE = BLOBS_DIR.joinpath(".lock")
+GC_INTERVAL_SECONDS = section("blobs").get("gc_interval_seconds", 600)
+
+logger = logging.getLogger("api.blobs")
+
+
+def _blob_dir(sha256):
+    return BLOBS_DIR.joinpath(sha256[:2])
+
+def _refs_dir(sha256):
+    return _blob_dir(sha256).joinpath(f"{sha256}.refs")
+
+def find_blob(sha256):
+    """Path of the stored blob with this content hash, or None."""
+    directory = _blob_dir(sha256)
+    if not directory.exists():
+        return None
+    return next((p for p in directory.glob(f"{sha256}*") if p.is_file()), None)
+
+def blob_path(sha256, ext):
+    return _blob_dir(sha256).joinpath(f"{sha256}.{ext}" if ext else sha256)
+
+def is_blob(path):
+    return Path(path).resolve().is_relative_to(BLOBS_DIR.resolve())
+
+def add_reference(sha256, file_id, staged=None, ext=""):
+    """Reference the blob `sha256` from `file_id` and return the blob path.
+
+    If the blob is not stored yet, `staged` (a complete temporary copy of the
+    content) is moved into place; without it None is returned so that the
+    caller can stage the content and retry. Called from a worker thread."""
+    with file_lock(LOCK_FILE):
+        if (path := find_blob(sha256)) is None:
+            if staged is None:
+                return None
+            path = blob_path(sha256, ext)
+            os.replace(staged, path)
+        elif staged is not None:
+            Path(staged).unlink(missing_ok=True)
+        refs = _refs_dir(sha256)
+        refs.mkdir(parents=True, exist_ok=True)
+        refs.joinpath(str(file_id)).touch()
+        return path
+
+def release(sha256, file_id):
+    """Drop the reference of `file_id` to a blob; the blob itself goes at the next collection."""
+    _refs_dir(sha256).joinpath(str(file_id)).unlink(missing_ok=True)
+
+def collect_garbage():
+    """Delete the blobs nobody references anymore; returns how many were removed."""
+    removed = 0
+    if not BLOBS_DIR.exists():
+        return removed
+    with file_lock(LOCK_FILE):
+        for directory in BLOBS_DIR.iterdir():
+            if not directory.is_dir():
+                continue
+            # Dotfiles are uploads being staged
+            for blob in [p for p in directory.iterdir() if p.is_file() and not p.name.startswith(".")]:
+                sha256 = blob.name.split(".")[0]
+                refs = _refs_dir(sha256)
+                if refs.exists() and any(refs.iterdir()):
+                    continue
+                blob.unlink(missing_ok=True)
+                previews.remove(blob)
+                if refs.exists():
+                    refs.rmdir()
+                removed += 1
+    if removed:
+        logger.info("Collected %d unreferenced blob(s)", removed)
+    return removed
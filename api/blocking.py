@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio, logging
+
+from api import metrics
+from api.settings import section
+
+# -------------------------------------------------
+# Bounded thread pool for blocking disk I/O
+# -------------------------------------------------
+# Async route handlers hand their blocking work (file writes, JSON
+# (de)serialisation, directory removal...) to this pool instead of running it
+# on the event loop.
+
+IO_THREADS = section("io").get("threads", 8)
+
+_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run `fn(*args, **kwargs)` on the I/O pool and await its result."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+# Event loop lag: how late the loop wakes up from a short sleep, i.e. how long
+# something blocked it. Sampled by monitor_event_loop() in the app lifespan.
+LAG_WARNING_MS = section("io").get("loop_lag_warning_ms", 100)
+
+loop_lag = {"samples": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+
+logger = logging.getLogger("api.blocking")
+
+
+async def monitor_event_loop(interval=0.1):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag_ms = max(0.0, (loop.time() - start - interval) * 1000)
+        loop_lag["samples"] += 1
+        loop_lag["last_ms"] = lag_ms
+        loop_lag["max_ms"] = max(loop_lag["max_ms"], lag_ms)
+        loop_lag["total_ms"] += lag_ms
+        metrics.event_loop_lag.set(lag_ms / 1000)
+        if lag_ms > LAG_WARNING_MS:
+            logger.warning("Event loop blocked for %.0f ms", lag_ms)
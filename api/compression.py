@@ -0,0 +1,130 @@
+from starlette.datastructures import Headers, MutableHeaders
+import gzip, zlib
+
+from api.serialization import EncodedCache
+from api.settings import section
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# -------------------------------------------------
+# Response compression
+# -------------------------------------------------
+# API JSON (and NDJSON streams) above `compression.minimum_bytes` is
+# compressed with Brotli when the client accepts it and the brotli package is
+# installed, gzip otherwise. A compressed response gets a weak ETag (its bytes
+# differ from the identity representation; If-None-Match compares weakly), and
+# its compressed body is cached per URL and ETag, so an unchanged listing is
+# compressed once. Streams are compressed and flushed chunk by chunk. Responses
+# that are already encoded (precompressed static assets), partial, or of other
+# types (files) are passed through.
+
+_settings = section("compression")
+MINIMUM_BYTES = _settings.get("minimum_bytes", 1024)
+GZIP_LEVEL = _settings.get("gzip_level", 6)
+BROTLI_QUALITY = _settings.get("brotli_quality", 5)
+MEDIA_TYPES = set(_settings.get("media_types", ["application/json", "application/x-ndjson"]))
+CACHE_BYTES = int(_settings.get("cache_mb", 16) * 1024 * 1024)
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_compressed = EncodedCache(CACHE_BYTES)
+
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """The first of `available` the Accept-Encoding header allows, or None."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        try:
+            q = float(params.strip().removeprefix("q=")) if params.strip().startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        accepted[name.strip()] = q
+    return next((e for e in available if accepted.get(e, accepted.get("*", 0)) > 0), None)
+
+def compress(data, encoding, brotli_quality=BROTLI_QUALITY, gzip_level=GZIP_LEVEL):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.chunk = lambda data: self.compressor.process(data) + self.compressor.flush()
+            self.finish = self.compressor.finish
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            # Flushed: every line of a stream reaches the client as soon as it is produced
+            self.chunk = lambda data: self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self.compressor.flush
+
+
+class CompressionMiddleware:
+    """Compress JSON responses for clients that accept it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        if (encoding := negotiate(Headers(scope=scope).get("accept-encoding", ""))) is None:
+            return await self.app(scope, receive, send)
+
+        start, stream = None, None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, stream, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if stream is not None:
+                body = stream.chunk(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += stream.finish()
+                return await send({"type": "http.response.body", "body": body, "more_body": message.get("more_body", False)})
+            if message["type"] != "http.response.body":
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            headers = MutableHeaders(raw=start["headers"])
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            media_type = headers.get("content-type", "").split(";")[0].strip()
+            if media_type in MEDIA_TYPES:
+                headers.add_vary_header("Accept-Encoding")
+            if (media_type not in MEDIA_TYPES or start["status"] in (204, 206, 304) or "content-encoding" in headers
+                    or "content-range" in headers or (not more_body and len(body) < MINIMUM_BYTES)):
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                if "content-length" in headers:
+                    del headers["content-length"]
+                stream = _StreamCompressor(encoding)
+                await send(start)
+                return await send({"type": "http.response.body", "body": stream.chunk(body), "more_body": True})
+            if etag and not etag.startswith("W/"):
+                # Same URL and ETag, same body: compressed once
+                key = (scope["path"], scope.get("query_string", b""), encoding)
+                body = _compressed.get(key, etag, lambda: compress(body, encoding))
+            else:
+                body = compress(body, encoding)
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
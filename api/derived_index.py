@@ -0,0 +1,70 @@
+from api import storage
+
+# -------------------------------------------------
+# Indexes derived from the report collections
+# -------------------------------------------------
+# The report-ID index, the statistics, the search index and the automatic
+# validation heap each keep a per-user part built from the user's reports.
+# They are built at startup and kept current by the storage change listeners,
+# and every user part records the storage version it was built from: users
+# whose reports changed behind our back (another worker, an out-of-band edit)
+# are rebuilt by `refresh_stale` before the index is used.
+
+
+class DerivedIndex:
+    """The per-user bookkeeping of an index derived from the report collections.
+
+    `index_user(user_id)` builds the user's part (replacing any previous one),
+    `forget_user(user_id)` drops it and `apply(event, user_id, day, record)`
+    handles a record-level change (put_record, delete_record, put_day) of a user
+    already indexed. All three are called with `lock` held."""
+
+    def __init__(self, lock, index_user, forget_user, apply):
+        self.lock = lock
+        self.versions = {}  # user_id -> storage version of the reports when indexed
+        self._index_user = index_user
+        self._forget_user = forget_user
+        self._apply = apply
+        storage.subscribe(self._on_report_change)
+
+    def rebuild(self):
+        """Index every user; the caller has cleared its own state."""
+        with self.lock:
+            self.versions.clear()
+            for user_id in storage.report_user_ids():
+                self.index_user(user_id)
+
+    def index_user(self, user_id):
+        user_id = str(user_id)
+        self._index_user(user_id)
+        self.versions[user_id] = storage.version("reports", user_id)
+
+    def forget_user(self, user_id):
+        user_id = str(user_id)
+        self._forget_user(user_id)
+        self.versions.pop(user_id, None)
+
+    def refresh_stale(self):
+        """Re-index the users whose reports changed without going through this process; True if any."""
+        refreshed = False
+        with self.lock:
+            user_ids = set(storage.report_user_ids())
+            for user_id in set(self.versions) - user_ids:
+                self.forget_user(user_id)
+                refreshed = True
+            for user_id in user_ids:
+                if self.versions.get(user_id) != storage.version("reports", user_id):
+                    self.index_user(user_id)
+                    refreshed = True
+        return refreshed
+
+    def _on_report_change(self, event, user_id, day, record):
+        user_id = str(user_id)
+        with self.lock:
+            if event == "drop":
+                self.forget_user(user_id)
+            elif event == "write" or user_id not in self.versions:
+                self.index_user(user_id)
+            else:
+                self._apply(event, user_id, day, record)
+                self.versions[user_id] = storage.version("reports", user_id)
@@ -0,0 +1,74 @@
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from pathlib import Path
+import hashlib, mimetypes, os
+
+from api import blobs, previews
+from api.http_cache import etag_matches
+from api.settings import section
+from api.storage import DATABASE_DIR
+
+# -------------------------------------------------
+# Protected file serving
+# -------------------------------------------------
+# Files are served with validators (ETag, Last-Modified) and answer conditional
+# requests with 304. Blobs are content-addressed, so their ETag is their hash
+# and they are cacheable forever. Byte ranges (single and multipart) and the
+# zero-copy `http.response.pathsend` extension, when the ASGI server offers it,
+# come from Starlette's FileResponse. With `files.offload` the transfer is
+# handed to the front proxy instead (nginx X-Accel-Redirect or X-Sendfile).
+# `size` serves a thumbnail or PDF preview instead of the file (api/previews.py).
+
+FILES_DIR = DATABASE_DIR.joinpath("files")
+
+_settings = section("files")
+OFFLOAD = _settings.get("offload", "none")  # "none", "x-accel-redirect" or "x-sendfile"
+ACCEL_PREFIX = _settings.get("accel_prefix", "/protected-files/")
+
+
+def resolve_file(path):
+    """Absolute path of a file under database/files; 400/404 for anything else."""
+    root = FILES_DIR.resolve()
+    full_path = FILES_DIR.joinpath(path).resolve()
+    if ".." in Path(path).parts or not full_path.is_relative_to(root):
+        raise HTTPException(status_code=400, detail="Invalid path")
+    if not full_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    return full_path
+
+def _not_modified(request, etag, mtime):
+    if (if_none_match := request.headers.get("if-none-match")) is not None:
+        return etag_matches(if_none_match, etag)
+    if if_modified_since := request.headers.get("if-modified-since"):
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def serve_file(request: Request, path, size=None):
+    """Response for GET /files/{path}: 304, proxy hand-off or the file itself (ranges supported)."""
+    source = resolve_file(path)
+    # Rendered now if it is still missing: blocks this worker thread, not the event loop
+    full_path = previews.preview(source, size) if size is not None else source
+    stat_result = os.stat(full_path)
+    if blobs.is_blob(source):
+        etag = f'"{source.name.split(".")[0]}{"-" + size if size is not None else ""}"'
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        etag = '"' + hashlib.md5(f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode(), usedforsecurity=False).hexdigest() + '"'
+        cache_control = "private, no-cache"
+    headers = {"ETag": etag, "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True), "Cache-Control": cache_control}
+
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    # The proxy sends the body itself (ranges included): answer with headers only
+    media_type = mimetypes.guess_type(full_path.name)[0] or "application/octet-stream"
+    if OFFLOAD == "x-accel-redirect":
+        relative = full_path.relative_to(FILES_DIR.resolve()).as_posix()
+        return Response(headers=headers | {"X-Accel-Redirect": ACCEL_PREFIX + relative}, media_type=media_type)
+    if OFFLOAD == "x-sendfile":
+        return Response(headers=headers | {"X-Sendfile": str(full_path)}, media_type=media_type)
+    return FileResponse(full_path, headers=headers, stat_result=stat_result)
@@ -0,0 +1,40 @@
+from fastapi import Request, Response
+import hashlib, json
+
+from api import storage
+
+# -------------------------------------------------
+# Conditional GET
+# -------------------------------------------------
+# ETags are derived from storage versions only, so a matching If-None-Match is
+# answered with a 304 before any collection is loaded or serialised. Versions
+# come from the database files, so every worker gives the same ETag.
+
+
+def make_etag(*parts):
+    """Strong ETag for a response that only depends on `parts` (versions, parameters...)."""
+    digest = hashlib.sha1(json.dumps([storage.epoch(), *parts], default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def reports_etag(user_ids, *parts):
+    """ETag over the report collections of `user_ids` (the ids present in the backend)."""
+    return make_etag("reports", [(str(uid), storage.version("reports", uid)) for uid in user_ids], *parts)
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+def cache_headers(etag):
+    # Per-user data: browsers may keep it but must revalidate it on every use
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def conditional(request: Request, response: Response, etag):
+    """Return a 304 response if the client already has `etag`; otherwise tag `response` with it."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    response.headers.update(cache_headers(etag))
+    return None
@@ -0,0 +1,69 @@
+import threading
+
+from api import storage
+from api.settings import section
+
+# -------------------------------------------------
+# ID allocation
+# -------------------------------------------------
+# IDs are handed out from blocks reserved in tracker.json. Reserving a block
+# moves `last_*_id` to the end of the block under the tracker's cross-process
+# lock and persists it before any ID of the block is used, so workers never hand
+# out the same ID and a crash can only leave gaps, never reuse an ID.
+#
+# A database reset rewinds the counters and bumps `reset_epoch`: every worker
+# drops the blocks it reserved in an earlier epoch before handing out an ID.
+
+BLOCK_SIZE = section("ids").get("block_size", 20)
+
+COUNTERS = {
+    "user": "last_user_id",
+    "post": "last_post_id",
+    "record": "last_record_id",
+    "file": "last_file_id",
+}
+
+_lock = threading.Lock()
+_blocks = {}  # kind -> [next id, last id of the reserved block, reset epoch]
+
+
+def allocate_id(kind):
+    """Return a new unique id for `kind` ("user", "post", "record" or "file")."""
+    with _lock:
+        block = _blocks.get(kind)
+        if block is None or block[0] > block[1] or block[2] != storage.read("tracker").get("reset_epoch", 0):
+            block = _blocks[kind] = _reserve_block(kind)
+        new_id = block[0]
+        block[0] += 1
+        return new_id
+
+def _reserve_block(kind):
+    counter = COUNTERS[kind]
+
+    def reserve(tracker):
+        last_id = tracker.get(counter)
+        if last_id is None:
+            last_id = _highest_used_id(kind)
+        tracker[counter] = last_id + BLOCK_SIZE
+        return [last_id + 1, last_id + BLOCK_SIZE, tracker.get("reset_epoch", 0)]
+    return storage.update("tracker", reserve)
+
+def _highest_used_id(kind):
+    """Seed a missing counter from the data already in the database."""
+    if kind == "user":
+        return max((int(k) for k in storage.read("users")), default=0)
+    if kind == "post":
+        return max((p.get("id", 0) for p in storage.read("posts") or []), default=0)
+
+    highest = 0
+    for user_id in storage.report_user_ids():
+        for day_report in storage.read("reports", user_id).get("items", {}).values():
+            for record in day_report.get("records", []):
+                if kind == "record":
+                    highest = max(highest, record.get("id", 0))
+                else:
+                    highest = max([highest] + [f.get("id", 0) for f in (record.get("content") or {}).get("files") or []])
+    if kind == "file":
+        for post in storage.read("posts") or []:
+            highest = max([highest] + [f.get("id", 0) for f in post.get("content", {}).get("files", [])])
+    return highest
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from pathlib import Path
+import os, threading
+
+# -------------------------------------------------
+# Cross-process file locks
+# -------------------------------------------------
+if os.name == "nt":
+    import msvcrt
+
+    def _acquire(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _release(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _acquire(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _release(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` (created if needed) shared by every process on the machine."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        _acquire(f)
+        try:
+            yield
+        finally:
+            _release(f)
+
+
+class ReentrantFileLock:
+    """Exclusive across processes and threads, re-entrant within the thread holding it.
+
+    `retain()` keeps the file lock past the last exit until `unretain()`: other
+    processes stay out while the threads of this one may take the lock again."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.state = threading.Lock()  # guards depth, retained and file
+        self.depth = 0
+        self.retained = 0
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            with self.state:
+                if self.file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self.file = open(self.path, "a+b")
+                    try:
+                        _acquire(self.file)
+                    except BaseException:
+                        self.file.close()
+                        self.file = None
+                        raise
+                self.depth += 1
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.state:
+            self.depth -= 1
+            if self.depth == 0 and not self.retained:
+                self._unlock()
+        self.lock.release()
+        return False
+
+    def retain(self):
+        """Keep the file locked after the last exit; called by the thread holding the lock."""
+        with self.state:
+            self.retained += 1
+
+    def unretain(self):
+        """Undo a `retain()`, from any thread."""
+        with self.state:
+            self.retained -= 1
+            if self.depth == 0 and not self.retained:
+                self._unlock()
+
+    def _unlock(self):
+        try:
+            _release(self.file)
+        finally:
+            self.file.close()
+            self.file = None
+
+
+_named = {}
+_named_lock = threading.Lock()
+
+def named_lock(path):
+    """The process-wide ReentrantFileLock of `path`."""
+    key = str(path)
+    with _named_lock:
+        if (lock := _named.get(key)) is None:
+            lock = _named[key] = ReentrantFileLock(path)
+        return lock
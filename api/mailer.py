@@ -0,0 +1,236 @@
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from pathlib import Path
+import json, logging, queue, smtplib, threading, time
+
+from api import metrics
+from api.settings import config, section
+
+# -------------------------------------------------
+# Outbound mail queue
+# -------------------------------------------------
+# Messages are queued and delivered by background worker threads, so a request
+# never waits on the mail server. Workers drain bursts in batches over SMTP
+# connections kept open in a small pool (checked with NOOP before reuse), and
+# failed messages are retried with exponential backoff.
+#
+# `mail.backend` selects the transport: "smtp", "memory" (kept in
+# `mailer.transport.outbox`, for tests) or "file" (one JSON line per message
+# appended to `mail.outbox_path`).
+
+_settings = section("mail")
+SMTP_CONFIG_FILE = Path("api/config.json")
+
+logger = logging.getLogger("api.mailer")
+
+
+def _smtp_settings():
+    settings = dict(config)
+    if SMTP_CONFIG_FILE.exists():
+        settings |= json.load(open(SMTP_CONFIG_FILE, "r", encoding="utf-8"))
+    settings |= _settings
+    return settings.get("smtp_server"), settings.get("tls_port"), settings.get("admin_email"), settings.get("admin_email_password")
+
+
+class SmtpTransport:
+    """STARTTLS SMTP connections, reused across batches."""
+
+    def __init__(self, pool_size=2):
+        self.server, self.port, self.sender, self.password = _smtp_settings()
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.server, self.port, timeout=30)
+        server.starttls() # Enable encryption
+        server.login(self.sender, self.password)
+        return server
+
+    def _acquire(self):
+        try:
+            server = self.pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        try:
+            if server.noop()[0] == 250:
+                return server
+        except smtplib.SMTPException:
+            pass
+        self._close(server)
+        return self._connect()
+
+    def _release(self, server):
+        try:
+            self.pool.put_nowait(server)
+        except queue.Full:
+            self._close(server)
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+    def send_batch(self, messages):
+        """Send messages over one connection; returns the ones that failed."""
+        server, failed = self._acquire(), []
+        for i, msg in enumerate(messages):
+            try:
+                server.sendmail(self.sender, msg["To"], msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                # The rest of the batch needs a new connection
+                failed.extend(messages[i:])
+                self._close(server)
+                return failed
+            except smtplib.SMTPException:
+                logger.exception("Could not send mail to %s", msg["To"])
+                failed.append(msg)
+        self._release(server)
+        return failed
+
+    def close(self):
+        while True:
+            try:
+                self._close(self.pool.get_nowait())
+            except queue.Empty:
+                return
+
+
+class MemoryTransport:
+    def __init__(self):
+        self.sender = _smtp_settings()[2]
+        self.outbox = []
+
+    def send_batch(self, messages):
+        self.outbox.extend(messages)
+        return []
+
+    def close(self):
+        pass
+
+
+class FileTransport:
+    def __init__(self, path):
+        self.sender = _smtp_settings()[2]
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def send_batch(self, messages):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            for msg in messages:
+                f.write(json.dumps({"to": msg["To"], "subject": msg["Subject"], "body": msg.as_string()}, ensure_ascii=False) + "\n")
+        return []
+
+    def close(self):
+        pass
+
+
+class Mailer:
+    def __init__(self, transport, workers=2, batch_size=20, max_attempts=5, retry_backoff=2.0):
+        self.transport = transport
+        self.n_workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.retrying = set()
+
+    def send(self, msg):
+        """Queue a message for delivery and return immediately."""
+        msg.attempts = getattr(msg, "attempts", 0)
+        self.queue.put(msg)
+        self._start()
+
+    def _start(self):
+        with self.lock:
+            while len(self.workers) < self.n_workers:
+                worker = threading.Thread(target=self._work, name=f"mailer-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def _work(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            transport, start = type(self.transport).__name__, time.perf_counter()
+            try:
+                failed = self.transport.send_batch(batch)
+            except Exception:
+                logger.exception("Mail delivery of %d message(s) failed", len(batch))
+                failed = batch
+            metrics.smtp_latency.observe(time.perf_counter() - start, transport=transport)
+            metrics.mails.inc(len(batch) - len(failed), transport=transport, outcome="sent")
+            metrics.mails.inc(len(failed), transport=transport, outcome="failed")
+            for msg in failed:
+                self._retry(msg)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _retry(self, msg):
+        msg.attempts += 1
+        if msg.attempts >= self.max_attempts:
+            logger.error("Giving up on mail to %s after %d attempts", msg["To"], msg.attempts)
+            return
+        delay = self.retry_backoff * 2 ** (msg.attempts - 1)
+        timer = threading.Timer(delay, self._requeue, (msg,))
+        timer.daemon = True
+        with self.lock:
+            self.retrying.add(timer)
+        timer.start()
+
+    def _requeue(self, msg):
+        with self.lock:
+            self.retrying = {t for t in self.retrying if t.is_alive() and t is not threading.current_thread()}
+        self.queue.put(msg)
+
+    def flush(self, timeout=None):
+        """Wait until every queued message has been handed to the transport (retries excluded)."""
+        done = threading.Event()
+        threading.Thread(target=lambda: (self.queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        self.flush(timeout)
+        self.transport.close()
+
+
+def _create_transport():
+    backend = _settings.get("backend", "smtp")
+    if backend == "memory":
+        return MemoryTransport()
+    if backend == "file":
+        return FileTransport(_settings.get("outbox_path", "database/outbox.jsonl"))
+    return SmtpTransport(_settings.get("pool_size", 2))
+
+mailer = Mailer(
+    _create_transport(),
+    workers=_settings.get("workers", 2),
+    batch_size=_settings.get("batch_size", 20),
+    max_attempts=_settings.get("max_attempts", 5),
+    retry_backoff=_settings.get("retry_backoff_seconds", 2.0),
+)
+
+
+def verification_message(recipient_email, code):
+    msg = MIMEMultipart()
+    msg['From'] = mailer.transport.sender
+    msg['To'] = recipient_email
+    msg['Subject'] = "Validation Code"
+    # Add plain text and HTML content
+    html_content = f"""\
+    <html>
+    <body>
+        <h1>Validation Code</h1>
+        <p>This is your verification code: <b>{code}</b>. Don't share it to anyone.</p>
+    </body>
+    </html>
+    """
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg
@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+import bisect, math, threading, time
+
+# -------------------------------------------------
+# Instrumentation
+# -------------------------------------------------
+# In-process counters and histograms, rendered in the Prometheus text format
+# on /api/metrics. Values are per worker process: scrape every worker, or sum
+# them in the query. Labels must stay low-cardinality (route templates,
+# collection names), never ids or paths.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IO_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+_metrics = []
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> total
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                yield self.name + "_total", self._labels(key), value
+
+    def _labels(self, key, **extra):
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                yield self.name, self._labels(key), value
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            if (series := self.values.get(key)) is None:
+                # Bucket counts (not cumulative), then count and sum
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0, 0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), series):
+                    cumulative += count
+                    yield self.name + "_bucket", self._labels(key, le=_format(bound)), cumulative
+                yield self.name + "_count", self._labels(key), series[-2]
+                yield self.name + "_sum", self._labels(key), series[-1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{{{labels}}} {_format(value)}" if labels else f"{name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter("http_requests", "HTTP requests handled.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Time from request start to the end of the response body.", ("method", "route"))
+storage_latency = Histogram("storage_operation_duration_seconds", "Duration of storage reads (load_data) and writes (save_data and record-level changes).", ("operation", "collection"), IO_BUCKETS)
+storage_bytes_read = Counter("storage_read_bytes", "Bytes loaded from the storage backend (cache misses only).", ("collection",))
+storage_bytes_written = Counter("storage_written_bytes", "Bytes written to the storage backend.", ("collection",))
+upload_bytes = Counter("upload_bytes", "Bytes received in uploaded files.", ("kind",))
+upload_latency = Histogram("upload_duration_seconds", "Time spent receiving and storing one uploaded file.", ("kind",))
+smtp_latency = Histogram("smtp_send_duration_seconds", "Time spent delivering one batch of mails.", ("transport",))
+mails = Counter("mail_messages", "Mails handed to the transport.", ("transport", "outcome"))
+event_loop_lag = Gauge("event_loop_lag_seconds", "Last measured delay of the event loop.")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method and route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start, status = time.perf_counter(), 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(method=scope["method"], route=route, status=status)
+            http_latency.observe(time.perf_counter() - start, method=scope["method"], route=route)
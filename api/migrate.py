@@ -0,0 +1,58 @@
+"""One-shot migration of the JSON database (database/*.json) into the SQLite backend.
+
+Usage: python -m api.migrate [--sqlite-path database/reports.db] [--force]
+
+Then set "storage": {"backend": "sqlite"} in config.json. The JSON files are
+left untouched and can be kept as a backup.
+"""
+import argparse, sys
+
+from api import storage
+from api.sqlite_backend import SqliteBackend
+
+COLLECTIONS = ["users", "sessions", "tracker", "posts"]
+
+
+def migrate(sqlite_path, force=False):
+    source = storage.JsonBackend()
+    target = SqliteBackend(sqlite_path)
+    summary = {}
+    # One transaction: the database is left either as it was or fully replaced
+    with target.lock, target.transaction() as db:
+        previous_owners = set(target.report_user_ids())
+        if previous_owners or target.read("users"):
+            if not force:
+                raise SystemExit(f"{sqlite_path} already contains data, use --force to overwrite it")
+            # Nothing the JSON tree no longer has may survive the migration
+            for table in ("users", "sessions", "days", "reports", "files", "collections"):
+                db.execute(f"DELETE FROM {table}")
+            # Versions keep counting, so that no cache or ETag of the old content matches again
+            db.execute("UPDATE versions SET version = version + 1")
+
+        for category in COLLECTIONS:
+            if storage.data_path(category).exists():
+                data = source.read(category)
+                target.write(data, category)
+                summary[category] = len(data)
+
+        n_records = 0
+        for user_id in source.report_user_ids():
+            reports = source.read("reports", user_id)
+            if not reports:
+                continue
+            target.write(reports, "reports", user_id)
+            n_records += sum(len(d.get("records", [])) for d in reports.get("items", {}).values())
+    summary["report owners"] = len(source.report_user_ids())
+    summary["records"] = n_records
+    if removed := previous_owners - set(source.report_user_ids()):
+        summary["report owners removed"] = len(removed)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the JSON database into SQLite")
+    parser.add_argument("--sqlite-path", default=str(storage.DATABASE_DIR.joinpath("reports.db")))
+    parser.add_argument("--force", action="store_true", help="replace the content of an existing SQLite database")
+    args = parser.parse_args()
+    for name, count in migrate(args.sqlite_path, args.force).items():
+        print(f"{name}: {count}")
+    print(f'Done. Set "storage": {{"backend": "sqlite", "sqlite_path": "{args.sqlite_path}"}} in config.json', file=sys.stderr)
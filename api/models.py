@@ -1,6 +1,6 @@
 from fastapi import Form
 from pydantic import BaseModel, validator
-from typing import List, Optional, Dict
+from typing import Any, List, Literal, Optional, Dict, Union
 from enum import Enum
 
 class LoginParamType(str, Enum):
@@ -27,7 +27,7 @@ class User(BaseModel):
     role: str
     phone: str
     email: str
-    profile_image: Optional[str] = ""
+    profile_image: Optional[Union[str, Dict[str, Any]]] = ""
     api_key: str
     created_at: str
     last_edit_at: Optional[str] = ""
@@ -73,10 +73,12 @@ class FileOut(BaseModel):
     path: str
     name: str # filename
     type: str # content_type
+    size: Optional[int] = None # bytes
+    sha256: Optional[str] = None # content hash
 
 class ExtraField(BaseModel):
     key: str
-    value: str
+    value: Any
 
 class ReportContent(BaseModel):
     text: Optional[str] = Form("")
@@ -87,7 +89,7 @@ class Report(BaseModel):
     id: int
     title: str
     content: Optional[ReportContent] = None
-    user_id: str
+    user_id: int
     day: str
     created_at: str
     last_edit_at: Optional[str] = ""
@@ -99,8 +101,9 @@ class DayReport(BaseModel):
     validated_by: int
 
 class UserReports(BaseModel):
-    items: Dict[str, DayReport]
-    user_id: int
+    # A user without reports has an empty collection
+    items: Dict[str, DayReport] = {}
+    user_id: Optional[int] = None
 
 class ReportIn(BaseModel):
     title: str = Form(...)
@@ -114,10 +117,32 @@ class ReportEdit(ReportIn):
     extra_fields: Optional[str] = Form("")
     files_to_delete: Optional[List[int]] = Form(None)
 
+class BatchOperation(BaseModel):
+    op: Literal["create", "edit", "delete", "validate_days"]
+    id: Optional[int] = None  # edit, delete
+    date: Optional[str] = ""  # day of the report; create: today if empty
+    title: Optional[str] = ""
+    text: Optional[str] = ""
+    extra_fields: Optional[Union[List[ExtraField], Dict[str, Any]]] = None
+    files_to_delete: List[int] = []
+    # validate_days (admins): the user, and the days or a range of days
+    user_id: Optional[int] = None
+    days: List[str] = []
+    day_from: Optional[str] = None
+    day_to: Optional[str] = None
+    validated: bool = True
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
 class ReportsListResponse(BaseModel):
     ok: bool
     reports: Dict[str, UserReports]
 
+class UserReportsResponse(BaseModel):
+    ok: bool
+    reports: UserReports
+
 class ReportResponse(BaseModel):
     ok: bool
     report: Report
@@ -0,0 +1,65 @@
+from pathlib import Path
+import os, tempfile
+
+from api.settings import section
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: without Pillow no preview is generated
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:  # optional: without it PDFs have no preview
+    pypdfium2 = None
+
+# -------------------------------------------------
+# Preview rendering (pool processes)
+# -------------------------------------------------
+# What the preview pool (api/previews.py) runs. Pool processes only import
+# this module to unpickle their tasks, so it stays free of the web stack:
+# no FastAPI, storage or mailer, only Pillow and pypdfium2.
+
+JPEG_QUALITY = section("previews").get("jpeg_quality", 82)
+
+
+def previews_dir(path):
+    return Path(path).with_name(Path(path).name + ".previews")
+
+def render(source, size, pixels):
+    """Write the preview of `source` at `pixels` (longest side); runs in a pool process."""
+    source = Path(source)
+    if source.suffix.lower() == ".pdf":
+        pdf = pypdfium2.PdfDocument(source)
+        try:
+            page = pdf[0]
+            image = page.render(scale=pixels / max(page.get_size())).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(source)
+        # JPEG decoding can downscale by 1/2..1/8 on its own, much cheaper than a full decode
+        image.draft("RGB", (pixels, pixels))
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((pixels, pixels), Image.LANCZOS)
+    transparent = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    ext = "png" if transparent else "jpg"
+    if not transparent and image.mode != "RGB":
+        image = image.convert("RGB")
+    directory = previews_dir(source)
+    directory.mkdir(exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{size}.", suffix=".part", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if transparent:
+                image.save(out, "PNG", optimize=True)
+            else:
+                image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        dest = directory.joinpath(f"{size}.{ext}")
+        os.replace(tmp_path, dest)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    # A replaced original may have switched between JPEG and PNG
+    directory.joinpath(f"{size}.{'jpg' if transparent else 'png'}").unlink(missing_ok=True)
+    return str(dest)
@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from pathlib import Path
+import logging, multiprocessing, os, shutil, threading
+
+from api.preview_worker import Image, previews_dir, pypdfium2, render
+from api.settings import section
+
+# -------------------------------------------------
+# Thumbnails and previews
+# -------------------------------------------------
+# Images get downscaled thumbnails and PDFs a rendering of their first page,
+# one per configured size, stored next to the original:
+#   <original>.previews/<size>.jpg (or .png when the image has transparency)
+# They are generated in a process pool when a file is uploaded, and on demand
+# when a size is requested before it exists (GET /files/{path}?size=small).
+# A preview older than its original (a replaced profile image) is regenerated.
+# Rendering needs Pillow, and pypdfium2 for PDFs. Files without a preview
+# (other types, unreadable images) get a 415 and clients fall back to the
+# original; not a 404, which the app turns into the web app's index page.
+
+_settings = section("previews")
+SIZES = _settings.get("sizes", {"small": 256, "medium": 800, "large": 1600})
+PROCESSES = _settings.get("processes", 2)
+TIMEOUT_SECONDS = _settings.get("timeout_seconds", 30)
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "bmp", "tif", "tiff"}
+
+logger = logging.getLogger("api.previews")
+
+_lock = threading.RLock()
+_executor = None
+_pending = {}  # (source, source mtime, size) -> Future of the preview path
+_failed = set()  # same keys, for files that could not be rendered
+
+
+def supported(path):
+    ext = Path(path).suffix.lower().lstrip(".")
+    if ext == "pdf":
+        return Image is not None and pypdfium2 is not None
+    return Image is not None and ext in IMAGE_EXTENSIONS
+
+def _cached(source, size, source_mtime):
+    directory = previews_dir(source)
+    for ext in ("jpg", "png"):
+        path = directory.joinpath(f"{size}.{ext}")
+        try:
+            if path.stat().st_mtime_ns >= source_mtime:
+                return path
+        except FileNotFoundError:
+            pass
+    return None
+
+def _pool():
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: the server process runs threads. The tasks are
+        # api.preview_worker.render, which imports none of the web stack
+        _executor = ProcessPoolExecutor(max_workers=PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def _submit(source, size, source_mtime):
+    """Future of the preview path, shared by every caller asking for the same preview."""
+    source = Path(source).resolve()
+    key = (str(source), source_mtime, size)
+    with _lock:
+        if key in _failed:
+            return None
+        if (future := _pending.get(key)) is None:
+            future = _pending[key] = _pool().submit(render, str(source), size, SIZES[size])
+            future.add_done_callback(lambda f: _done(key, f))
+        return future
+
+def _done(key, future):
+    global _executor
+    with _lock:
+        _pending.pop(key, None)
+        if future.cancelled() or (error := future.exception()) is None:
+            return
+        if isinstance(error, BrokenProcessPool):
+            # A pool process died (killed, out of memory): start a new pool for the next previews
+            _executor = None
+        else:
+            _failed.add(key)
+        logger.warning("No %s preview for %s: %r", key[2], key[0], error)
+
+def generate(path):
+    """Start rendering every size of `path` in the background (upload time)."""
+    if not supported(path):
+        return
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return
+    for size in SIZES:
+        if _cached(path, size, source_mtime) is None:
+            _submit(path, size, source_mtime)
+
+def preview(path, size):
+    """Path of the `size` preview of `path`, rendered now if missing; 400/415/503 otherwise."""
+    if size not in SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown size; expected one of {', '.join(SIZES)}")
+    path = Path(path)
+    if not supported(path) or path.parent.name.endswith(".previews"):
+        raise HTTPException(status_code=415, detail="No preview for this file")
+    source_mtime = os.stat(path).st_mtime_ns
+    if (cached := _cached(path, size, source_mtime)) is not None:
+        return cached
+    if (future := _submit(path, size, source_mtime)) is None:
+        raise HTTPException(status_code=415, detail="No preview for this file")
+    try:
+        return Path(future.result(timeout=TIMEOUT_SECONDS))
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Preview not ready", headers={"Retry-After": "5"})
+    except Exception:
+        raise HTTPException(status_code=415, detail="No preview for this file")
+
+def remove(path):
+    """Delete the previews of `path` (its original is gone)."""
+    shutil.rmtree(previews_dir(path), ignore_errors=True)
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,163 @@
+from datetime import datetime
+import logging
+
+from api import storage
+from api.ids import allocate_id
+from api.report_query import parse_day
+from api.settings import section
+
+# -------------------------------------------------
+# Batch report operations
+# -------------------------------------------------
+# POST /reports/batch takes a list of operations (create, edit, delete and,
+# for admins, validate_days) and groups them by the report collection they
+# change. Each group is applied in order to a single read of the collection and
+# saved with a single write, all or nothing: if one operation fails, none of
+# that user's operations is kept and the rest of the group is reported as
+# rolled back, while the other users' groups go through. Uploads are not part
+# of a batch; edits may drop attachments, released once the write succeeded.
+
+MAX_OPERATIONS = section("batch").get("max_operations", 1000)
+
+logger = logging.getLogger("api.report_batch")
+
+
+class OperationError(Exception):
+    """An operation that cannot be applied: its user's whole group is rolled back."""
+
+class _GroupFailed(Exception):
+    def __init__(self, index, message):
+        self.index, self.message = index, message
+
+
+def _day(value, default=None):
+    if not value and default:
+        return default
+    if (day := parse_day(value)) is None:
+        raise OperationError(f"Invalid date {value!r}, expected DD-MM-YYYY or YYYY-MM-DD")
+    return day.strftime("%d-%m-%Y")
+
+def _extra_fields(value):
+    if isinstance(value, dict):
+        return [{"key": k, "value": v} for k, v in value.items()]
+    return value
+
+def _find(data, op):
+    day = _day(op["date"])
+    day_report = data.get("items", {}).get(day)
+    if not day_report:
+        raise OperationError(f"No reports on the {day}")
+    index = next((i for i, r in enumerate(day_report["records"]) if r.get("id") == op["id"]), -1)
+    if index == -1:
+        raise OperationError(f"Report {op['id']} not found on the {day}")
+    return day_report, index
+
+def _create(data, op, user_id, released):
+    if not op["title"]:
+        raise OperationError("A title is required")
+    day = _day(op["date"], datetime.now().strftime("%d-%m-%Y"))
+    content = {"text": op["text"] or "", "files": [], "extra_fields": _extra_fields(op["extra_fields"]) or []}
+    record = {"id": op["id"], "title": op["title"], "content": content, "user_id": user_id, "day": day, "created_at": datetime.now().strftime("%H:%M:%S"), "last_edit_at": ""}
+    data.setdefault("items", {}).setdefault(day, storage.new_day_report(day))["records"].append(record)
+    return {"report": record}
+
+def _edit(data, op, user_id, released):
+    day_report, index = _find(data, op)
+    if day_report.get("validated"):
+        raise OperationError("This day is validated, its reports can't be edited anymore")
+    record = day_report["records"][index]
+    content = record.setdefault("content", {})
+    dropped = set(op["files_to_delete"])
+    released.extend(f for f in content.get("files", []) if f.get("id") in dropped)
+    content["files"] = [f for f in content.get("files", []) if f.get("id") not in dropped]
+    record["title"] = op["title"] or record["title"]
+    content["text"] = op["text"] or content.get("text", "")
+    if op["extra_fields"] is not None:
+        content["extra_fields"] = _extra_fields(op["extra_fields"])
+    record["last_edit_at"] = datetime.now().strftime("%H:%M:%S")
+    return {"report": record}
+
+def _delete(data, op, user_id, released):
+    day_report, index = _find(data, op)
+    record = day_report["records"].pop(index)
+    released.extend((record.get("content") or {}).get("files", []))
+    return {"report": record}
+
+def _validate_days(data, op, validator_id, released):
+    if not data.get("items"):
+        raise OperationError(f"User {op['user_id']} has no reports")
+    if op["days"]:
+        days = [day for day in map(_day, op["days"]) if day in data["items"]]
+    else:
+        # A range: every day of the user's reports within it
+        low, high = (parse_day(op[name]) if op[name] else None for name in ("day_from", "day_to"))
+        days = [day for day in data["items"] if (d := parse_day(day)) and (low is None or d >= low) and (high is None or d <= high)]
+    for day in days:
+        data["items"][day]["validated"] = op["validated"]
+        data["items"][day]["validated_by"] = validator_id if op["validated"] else -1
+    return {"user_id": op["user_id"], "days": days}
+
+OPERATIONS = {"create": _create, "edit": _edit, "delete": _delete, "validate_days": _validate_days}
+
+
+def _check(op):
+    if op["op"] in ("edit", "delete") and (op["id"] is None or not op["date"]):
+        raise OperationError("id and date are required")
+    if op["op"] == "validate_days":
+        if op["user_id"] is None:
+            raise OperationError("user_id is required")
+        if not op["days"] and not (op["day_from"] or op["day_to"]):
+            raise OperationError("days, or day_from/day_to, are required")
+        for name in ("day_from", "day_to"):
+            if op[name] and parse_day(op[name]) is None:
+                raise OperationError(f"Invalid {name}, expected DD-MM-YYYY or YYYY-MM-DD")
+
+def run(operations, user_id):
+    """Apply `operations` (dicts) for the session user `user_id`; returns (results, released files).
+
+    Results are in the order of the operations. Attachments of deleted reports and
+    dropped files are returned for the caller to release. Called from a worker thread."""
+    results = [None] * len(operations)
+    groups = {}
+    for index, op in enumerate(operations):
+        try:
+            _check(op)
+        except OperationError as e:
+            results[index] = {"index": index, "op": op["op"], "ok": False, "error": str(e)}
+            continue
+        # Only validations touch another user's reports
+        target = op["user_id"] if op["op"] == "validate_days" else user_id
+        groups.setdefault(int(target), []).append(index)
+
+    released = []
+    for target, indexes in groups.items():
+        for index in indexes:
+            if operations[index]["op"] == "create":
+                operations[index]["id"] = allocate_id("record")
+
+        def apply(data):
+            if not data:
+                data.update(storage.new_user_reports(target))
+            applied, files = [], []
+            for index in indexes:
+                op = operations[index]
+                try:
+                    applied.append((index, OPERATIONS[op["op"]](data, op, int(user_id), files)))
+                except OperationError as e:
+                    raise _GroupFailed(index, str(e))
+            return applied, files
+
+        try:
+            # One read and one write of the user's reports; nothing is written if an operation fails
+            applied, files = storage.update("reports", apply, target)
+        except _GroupFailed as failure:
+            for index in indexes:
+                error = failure.message if index == failure.index else f"Rolled back: operation {failure.index} failed"
+                results[index] = {"index": index, "op": operations[index]["op"], "ok": False, "error": error}
+            logger.info("reports.batch user=%s operations=%d rolled back: %s", target, len(indexes), failure.message)
+            continue
+        for index, result in applied:
+            results[index] = {"index": index, "op": operations[index]["op"], "ok": True} | result
+        released.extend(files)
+        logger.info("reports.batch user=%s operations=%d", target, len(indexes))
+    return results, released
@@ -0,0 +1,81 @@
+import threading
+
+from api import storage
+from api.derived_index import DerivedIndex
+
+# -------------------------------------------------
+# Global report-ID index
+# -------------------------------------------------
+# report id -> (user_id, day, position in the day's records), kept per user
+# like the other derived indexes (api/derived_index.py). Every hit is checked
+# against the resident reports, and stale users are re-indexed before a miss is
+# reported.
+
+_lock = threading.RLock()
+_locations = {}      # report id -> (user_id, day, position)
+_user_reports = {}   # user_id -> ids of the reports indexed for that user
+
+
+def rebuild():
+    """Re-index every user's reports from the storage backend."""
+    with _lock:
+        _locations.clear()
+        _user_reports.clear()
+        _users.rebuild()
+        return len(_locations)
+
+def locate(report_id):
+    """Return (user_id, day, position) of a report, or None."""
+    return _locations.get(report_id)
+
+def find_report(report_id):
+    """Return (user_id, record) for a report id, or None if it does not exist."""
+    if (found := _lookup(report_id)) is not None:
+        return found
+    if _users.refresh_stale():
+        return _lookup(report_id)
+    return None
+
+def _lookup(report_id):
+    location = _locations.get(report_id)
+    if location is None:
+        return None
+    user_id, day, position = location
+    records = storage.read("reports", user_id).get("items", {}).get(day, {}).get("records", [])
+    if position < len(records) and records[position].get("id") == report_id:
+        return user_id, records[position]
+    # The index is behind this user's reports
+    with _lock:
+        _users.index_user(user_id)
+    location = _locations.get(report_id)
+    if location is None:
+        return None
+    user_id, day, position = location
+    return user_id, storage.read("reports", user_id)["items"][day]["records"][position]
+
+def _forget_user(user_id):
+    for report_id in _user_reports.pop(user_id, ()):
+        _locations.pop(report_id, None)
+
+def _index_user(user_id):
+    _forget_user(user_id)
+    reports = storage.read("reports", user_id)
+    for day, day_report in reports.get("items", {}).items():
+        _index_day(user_id, day, day_report.get("records", []))
+
+def _index_day(user_id, day, records):
+    ids = _user_reports.setdefault(user_id, set())
+    for position, record in enumerate(records):
+        _locations[record.get("id")] = (user_id, day, position)
+        ids.add(record.get("id"))
+
+def _apply(event, user_id, day, record):
+    if event in ("put_record", "delete_record"):
+        if event == "delete_record":
+            _locations.pop(record.get("id"), None)
+            _user_reports.get(user_id, set()).discard(record.get("id"))
+        # Positions only move within the touched day
+        records = storage.read("reports", user_id).get("items", {}).get(day, {}).get("records", [])
+        _index_day(user_id, day, records)
+
+_users = DerivedIndex(_lock, _index_user, _forget_user, _apply)
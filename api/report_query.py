@@ -0,0 +1,102 @@
+from datetime import datetime
+from fastapi import HTTPException
+import base64, json
+
+from api import storage
+
+# -------------------------------------------------
+# Report listing: filters, cursor pagination, streaming
+# -------------------------------------------------
+# Records are walked in a stable order (user id, day date, record id) straight
+# from the resident collections, one user at a time, so a page or a streamed
+# export never needs the whole corpus assembled into a single response.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def parse_day(value):
+    """Parse a day given as DD-MM-YYYY or YYYY-MM-DD; None if it is neither."""
+    for d_format in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, d_format).date()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+def parse_day_range(day_from=None, day_to=None):
+    """The `day_from`/`day_to` query parameters as dates (None when absent); 400 if malformed."""
+    bounds = {}
+    for name, value in (("day_from", day_from), ("day_to", day_to)):
+        bounds[name] = parse_day(value) if value else None
+        if value and bounds[name] is None:
+            raise HTTPException(status_code=400, detail=f"Invalid {name}, expected DD-MM-YYYY or YYYY-MM-DD")
+    return bounds
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Return the (user_id, iso date, record id) a page stopped at; ValueError if malformed."""
+    try:
+        user_id, day, record_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(user_id), str(day), int(record_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def _sorted_user_ids(user_id=None):
+    if user_id is not None:
+        return [int(user_id)] if str(user_id) in storage.report_user_ids() else []
+    return sorted(int(uid) for uid in storage.report_user_ids())
+
+def iter_records(user_id=None, day_from=None, day_to=None, validated=None, title=None, after=None):
+    """Yield (position, record, day_report) matching the filters, in listing order.
+
+    `position` is the (user_id, iso date, record id) tuple a cursor is made of;
+    iteration starts right after `after` when given.
+    """
+    title = title.lower() if title else None
+    for uid in _sorted_user_ids(user_id):
+        if after is not None and uid < after[0]:
+            continue
+        days = []
+        for day, day_report in storage.read("reports", uid).get("items", {}).items():
+            date = parse_day(day)
+            if date is None:
+                continue
+            if (day_from and date < day_from) or (day_to and date > day_to):
+                continue
+            if validated is not None and bool(day_report.get("validated")) != validated:
+                continue
+            days.append((date.isoformat(), day_report))
+        for iso_day, day_report in sorted(days, key=lambda d: d[0]):
+            if after is not None and (uid, iso_day) < after[:2]:
+                continue
+            for record in sorted(day_report.get("records", []), key=lambda r: r.get("id")):
+                position = (uid, iso_day, record.get("id"))
+                if after is not None and position <= after:
+                    continue
+                if title and title not in (record.get("title") or "").lower():
+                    continue
+                yield position, record, day_report
+
+def listing_item(record, day_report):
+    """A record as returned by paginated and streamed listings."""
+    return record | {"validated": day_report.get("validated", False), "validated_by": day_report.get("validated_by", -1)}
+
+def page(limit, after=None, **filters):
+    """Return (items, next_cursor) for one page of at most `limit` records."""
+    items, last = [], None
+    for position, record, day_report in iter_records(after=after, **filters):
+        if len(items) == limit:
+            return items, encode_cursor(last)
+        items.append(listing_item(record, day_report))
+        last = position
+    return items, None
+
+def stream_ndjson(after=None, limit=None, **filters):
+    """Yield the matching records as newline-delimited JSON, one line per record."""
+    for count, (position, record, day_report) in enumerate(iter_records(after=after, **filters)):
+        if limit is not None and count >= limit:
+            return
+        yield json.dumps(listing_item(record, day_report), ensure_ascii=False) + "\n"
@@ -0,0 +1,195 @@
+import bisect, heapq, html, math, re, threading, unicodedata
+
+from api import storage
+from api.derived_index import DerivedIndex
+from api.report_query import listing_item, parse_day
+
+# -------------------------------------------------
+# Full-text search over reports
+# -------------------------------------------------
+# An in-process inverted index: term -> {report id: weighted frequency}. Titles,
+# the text of the Quill HTML bodies (tags stripped, entities decoded) and the
+# values of extra_fields are indexed, lowercased and without accents, a title
+# hit weighing more than an extra field, which weighs more than the body.
+# Results are ranked with BM25; `term*` matches every term starting with
+# `term`. Stale users (api/derived_index.py) are re-indexed before a search.
+
+FIELD_WEIGHTS = {"title": 3, "extra_fields": 2, "text": 1}
+K1, B = 1.2, 0.75
+
+_TAG = re.compile(r"<[^>]*>")
+_WORD = re.compile(r"\w+")
+
+_lock = threading.RLock()
+_docs = {}           # report id -> (user_id, day, iso date, {term: weighted frequency}, length)
+_postings = {}       # term -> {report id: weighted frequency}
+_terms = []          # sorted vocabulary, for prefix queries
+_user_docs = {}      # user_id -> ids of the reports indexed for that user
+_total_length = 0
+
+
+def strip_html(text):
+    """Visible text of an HTML fragment."""
+    return html.unescape(_TAG.sub(" ", text or ""))
+
+def tokenize(text):
+    """Lowercased words without accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return _WORD.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+def rebuild():
+    """Re-index every user's reports from the storage backend; returns the number of reports."""
+    global _total_length
+    with _lock:
+        for mapping in (_docs, _postings, _user_docs):
+            mapping.clear()
+        _terms.clear()
+        _total_length = 0
+        _users.rebuild()
+        return len(_docs)
+
+def search(query, user_id=None, day_from=None, day_to=None, limit=20, offset=0):
+    """Return (total, records) of the reports matching every term of `query`, best first.
+
+    Records are listing items with their `score`. `user_id` restricts the search to one
+    user's reports, `day_from`/`day_to` (dates) to a range of days."""
+    with _lock:
+        _users.refresh_stale()
+        groups = _query_groups(query)
+        if not groups or not _docs or not all(groups):
+            return 0, []
+        scores = _score(groups)
+        low = day_from.isoformat() if day_from else None
+        high = day_to.isoformat() if day_to else None
+        if user_id is not None or low or high:
+            scores = {report_id: score for report_id, score in scores.items() if _visible(_docs[report_id], user_id, low, high)}
+        # Best score first, then the most recent day
+        top = heapq.nlargest(offset + limit, scores, key=lambda report_id: (scores[report_id], _docs[report_id][2] or "", report_id))
+        hits = [(scores[report_id], _docs[report_id][0], _docs[report_id][1], report_id) for report_id in top[offset:]]
+    items = []
+    for score, owner, day, report_id in hits:
+        day_report = storage.read("reports", owner).get("items", {}).get(day, {})
+        if record := next((r for r in day_report.get("records", []) if r.get("id") == report_id), None):
+            items.append(listing_item(record, day_report) | {"score": round(score, 4)})
+    return len(scores), items
+
+def _visible(doc, user_id, low, high):
+    owner, _, iso, _, _ = doc
+    if user_id is not None and owner != str(user_id):
+        return False
+    return not ((low and (iso is None or iso < low)) or (high and (iso is None or iso > high)))
+
+def _query_groups(query):
+    """One list of index terms per query term, all to be matched; a prefix (`term*`) lists its expansions."""
+    groups = []
+    for word in query.split():
+        # Words split by the tokenizer (l'été, e-mail) give several terms: only the last one can be a prefix
+        *tokens, last = tokenize(word) or [None]
+        if last is None:
+            continue
+        groups.extend([token] if token in _postings else [] for token in tokens)
+        if word.endswith("*"):
+            start = bisect.bisect_left(_terms, last)
+            groups.append(_terms[start:bisect.bisect_left(_terms, last + "\uffff", start)])
+        else:
+            groups.append([last] if last in _postings else [])
+    return groups
+
+def _score(groups):
+    # Rarest group first, so that later groups only look at the remaining candidates
+    groups.sort(key=lambda alternatives: sum(len(_postings[term]) for term in alternatives))
+    average = _total_length / len(_docs) or 1
+    scores = None
+    for alternatives in groups:
+        matched = {}
+        for term in alternatives:
+            postings = _postings[term]
+            idf = math.log(1 + (len(_docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for report_id, frequency in postings.items():
+                if scores is not None and report_id not in scores:
+                    continue
+                length = _docs[report_id][4]
+                score = idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average))
+                # The best expansion of a prefix counts, not all of them
+                if score > matched.get(report_id, 0):
+                    matched[report_id] = score
+        scores = {report_id: score + (scores[report_id] if scores is not None else 0) for report_id, score in matched.items()}
+        if not scores:
+            break
+    return scores
+
+def _document_terms(record):
+    content = record.get("content") or {}
+    fields = {
+        "title": record.get("title") or "",
+        "text": strip_html(content.get("text")),
+        "extra_fields": " ".join(str(field.get("value", "")) for field in content.get("extra_fields") or [] if isinstance(field, dict)),
+    }
+    frequencies = {}
+    for name, text in fields.items():
+        for term in tokenize(text):
+            frequencies[term] = frequencies.get(term, 0) + FIELD_WEIGHTS[name]
+    return frequencies
+
+def _add(user_id, day, record, new_terms=None):
+    global _total_length
+    report_id = record.get("id")
+    _remove(report_id)
+    frequencies = _document_terms(record)
+    day_date = parse_day(day)
+    length = sum(frequencies.values())
+    _docs[report_id] = (user_id, day, day_date.isoformat() if day_date else None, frequencies, length)
+    _total_length += length
+    _user_docs.setdefault(user_id, set()).add(report_id)
+    for term, frequency in frequencies.items():
+        if (postings := _postings.get(term)) is None:
+            postings = _postings[term] = {}
+            if new_terms is None:
+                bisect.insort(_terms, term)
+            else:
+                new_terms.append(term)
+        postings[report_id] = frequency
+
+def _remove(report_id, bulk=False):
+    global _total_length
+    if (doc := _docs.pop(report_id, None)) is None:
+        return
+    user_id, _, _, frequencies, length = doc
+    _total_length -= length
+    _user_docs.get(user_id, set()).discard(report_id)
+    for term in frequencies:
+        postings = _postings[term]
+        postings.pop(report_id, None)
+        if not postings:
+            del _postings[term]
+            if not bulk:
+                del _terms[bisect.bisect_left(_terms, term)]
+
+def _forget_user(user_id):
+    for report_id in _user_docs.pop(user_id, set()):
+        _remove(report_id, bulk=True)
+    if len(_terms) != len(_postings):
+        _terms[:] = [term for term in _terms if term in _postings]
+
+def _index_user(user_id):
+    _forget_user(user_id)
+    # New terms are sorted into the vocabulary once, not one by one
+    new_terms = []
+    for day, day_report in storage.read("reports", user_id).get("items", {}).items():
+        for record in day_report.get("records", []):
+            _add(user_id, day, record, new_terms)
+    if new_terms:
+        _terms.extend(new_terms)
+        _terms.sort()
+
+def _apply(event, user_id, day, record):
+    if event in ("put_record", "delete_record"):
+        # Notifications can arrive out of order: the stored record is the one to index
+        report_id = record.get("id")
+        records = storage.read("reports", user_id).get("items", {}).get(day, {}).get("records", [])
+        if (stored := next((r for r in records if r.get("id") == report_id), None)) is not None:
+            _add(user_id, day, stored)
+        elif _docs.get(report_id, (None,))[0] == user_id:
+            _remove(report_id)
+
+_users = DerivedIndex(_lock, _index_user, _forget_user, _apply)
@@ -0,0 +1,120 @@
+from datetime import datetime
+import threading
+
+from api import storage
+from api.derived_index import DerivedIndex
+from api.report_query import parse_day
+
+# -------------------------------------------------
+# Report statistics
+# -------------------------------------------------
+# Per-user and per-day totals (reports, days, validated/unvalidated, attachment
+# volume, last activity) for the admin summary. Each (user, day) contributes
+# one set of counters; a change re-counts only the touched day, subtracting its
+# old contribution and adding the new one, so a summary never scans the
+# reports. Stale users (api/derived_index.py) are re-counted before a summary
+# is served.
+
+USER_FIELDS = ("reports", "days", "validated_days", "unvalidated_days", "validated_reports", "unvalidated_reports", "attachments", "attachment_bytes")
+DAY_FIELDS = ("reports", "users", "validated_reports", "unvalidated_reports", "attachments", "attachment_bytes")
+
+_lock = threading.RLock()
+_contributions = {}  # (user_id, day) -> (counters, iso date or None, last activity)
+_user_days = {}      # user_id -> days counted for that user
+_user_totals = {}    # user_id -> counters
+_user_last = {}      # user_id -> last activity (ISO timestamp)
+_day_totals = {}     # iso date -> counters over every user
+
+
+def rebuild():
+    """Count every user's reports from the storage backend; returns the number of users."""
+    with _lock:
+        for mapping in (_contributions, _user_days, _user_totals, _user_last, _day_totals):
+            mapping.clear()
+        _users.rebuild()
+        return len(_user_totals)
+
+def summary(day_from=None, day_to=None):
+    """Totals, per-user and per-day counters; `day_from`/`day_to` (dates) bound the per-day part."""
+    with _lock:
+        _users.refresh_stale()
+        # A report collection left without days counts on neither backend
+        users = {user_id: counters | {"last_activity": _user_last.get(user_id)} for user_id, counters in _user_totals.items() if counters["days"]}
+        days = {iso: dict(counters) for iso, counters in sorted(_day_totals.items())
+                if (day_from is None or iso >= day_from.isoformat()) and (day_to is None or iso <= day_to.isoformat())}
+    totals = {field: sum(counters[field] for counters in users.values()) for field in USER_FIELDS}
+    totals["users"] = len(users)
+    totals["last_activity"] = max((u["last_activity"] for u in users.values() if u["last_activity"]), default=None)
+    return {"totals": totals, "users": dict(sorted(users.items(), key=lambda item: (len(item[0]), item[0]))), "days": days}
+
+def _contribution(day, day_report):
+    records = day_report.get("records", [])
+    validated = bool(day_report.get("validated"))
+    files = [f for record in records for f in (record.get("content") or {}).get("files", [])]
+    counters = {
+        "reports": len(records), "days": 1, "validated_days": int(validated), "unvalidated_days": int(not validated),
+        "validated_reports": len(records) if validated else 0, "unvalidated_reports": 0 if validated else len(records),
+        "attachments": len(files), "attachment_bytes": sum(f.get("size") or 0 for f in files),
+    }
+    day_date = parse_day(day)
+    # Records only carry their creation time; the day gives the date
+    last = max((_timestamp(day_date, record.get("created_at")) for record in records), default=None) if day_date else None
+    return counters, day_date.isoformat() if day_date else None, last
+
+def _timestamp(day_date, time):
+    try:
+        return datetime.combine(day_date, datetime.strptime(time, "%H:%M:%S").time()).isoformat()
+    except (TypeError, ValueError):
+        return day_date.isoformat() + "T00:00:00"
+
+def _add_to_day(contribution, sign):
+    counters, iso, _ = contribution
+    if iso is None or not counters["reports"]:
+        return
+    day_totals = _day_totals.setdefault(iso, dict.fromkeys(DAY_FIELDS, 0))
+    day_totals["users"] += sign
+    for field in DAY_FIELDS:
+        if field != "users":
+            day_totals[field] += sign * counters[field]
+    if not day_totals["users"]:
+        del _day_totals[iso]
+
+def _add(user_id, day, contribution, sign):
+    counters, _, last = contribution
+    totals = _user_totals.setdefault(user_id, dict.fromkeys(USER_FIELDS, 0))
+    for field in USER_FIELDS:
+        totals[field] += sign * counters[field]
+    _add_to_day(contribution, sign)
+    if sign > 0:
+        _user_days.setdefault(user_id, set()).add(day)
+        if last and last > (_user_last.get(user_id) or ""):
+            _user_last[user_id] = last
+    else:
+        _user_days.get(user_id, set()).discard(day)
+        if last and last == _user_last.get(user_id):
+            # The latest activity went away: look for the next one
+            _user_last[user_id] = max((_contributions[(user_id, d)][2] or "" for d in _user_days.get(user_id, ())), default="") or None
+
+def _set_day(user_id, day, day_report):
+    if (old := _contributions.pop((user_id, day), None)) is not None:
+        _add(user_id, day, old, -1)
+    if day_report is not None:
+        _contributions[(user_id, day)] = contribution = _contribution(day, day_report)
+        _add(user_id, day, contribution, 1)
+
+def _forget_user(user_id):
+    for day in _user_days.pop(user_id, ()):
+        _add_to_day(_contributions.pop((user_id, day)), -1)
+    for mapping in (_user_totals, _user_last):
+        mapping.pop(user_id, None)
+
+def _count_user(user_id):
+    _forget_user(user_id)
+    _user_totals[user_id] = dict.fromkeys(USER_FIELDS, 0)
+    for day, day_report in storage.read("reports", user_id).get("items", {}).items():
+        _set_day(user_id, day, day_report)
+
+def _apply(event, user_id, day, record):
+    _set_day(user_id, day, storage.read("reports", user_id).get("items", {}).get(day))
+
+_users = DerivedIndex(_lock, _count_user, _forget_user, _apply)
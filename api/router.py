@@ -1,16 +1,34 @@
-from fastapi import APIRouter, Depends, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Request, Response, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List
+import logging
+
+from api import metrics
+from api.file_serving import serve_file
+from api.http_cache import cache_headers, conditional, make_etag, reports_etag
+from api.report_batch import MAX_OPERATIONS as MAX_BATCH_OPERATIONS, run as run_batch
+from api.report_index import find_report, locate as locate_report
+from api.report_query import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, page, parse_day_range, stream_ndjson
+from api.report_search import search as search_reports
+from api.report_stats import summary as report_summary
+from api.serialization import FastJSONResponse, dumps, envelope, json_response, mapping
+from api.sessions import approve_session, close_session, get_session, open_session
 
 from api.models import *
 from api.utilities import *
 
-router = APIRouter()
+router = APIRouter(prefix="/api")
+logger = logging.getLogger("api.router")
 
 @router.get("/")
 def root():
     return {"ok": True, "message": "Welcome to the Report API"}
 
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(authorized: bool = Depends(only_admin)):
+    """Request latencies, storage I/O, uploads and mail delivery, in the Prometheus text format. Admin only."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # -------------------------------------------
 # Login Operations
 # -------------------------------------------
@@ -18,18 +36,17 @@ def root():
 async def login(credentials: Credentials):
     credentials = credentials.dict()
     p, v = tuple(credentials.values())
-    users = load_data("users")
+    users = await load_data_async("users")
     user = next((u for k, u in users.items() if u.get(p) == v), {})
     if not user:
         raise HTTPException(status_code=401, detail="Utilisateur non existant")
-    sessions = load_data("sessions")
-    if sessions.get(user.get("api_key"), {}).get("approved"):
-        old_session_info = logout(sessions.get(user.get("api_key"))).get("session_info")
+    current_session = await run_blocking(get_session, user.get("api_key"))
+    if current_session and current_session.get("approved"):
+        old_session_info = (await run_blocking(logout, current_session)).get("session_info")
         result = await login(Credentials(**old_session_info.get("credentials")))
         return {"ok": True, "api_key": result.get("api_key"), "message": "Your previous session has been reinitialised. Please grant us the new verification code we sent you", "email": user.get("email")}
     session = {"credentials": credentials, "user_id": user.get("id"), "code": generate_verification_code(), "approved": False, "start_time": "", "api_key": user.get("api_key")} 
-    sessions[user.get("api_key")] = session
-    save_data(sessions, "sessions")
+    session = await run_blocking(open_session, user.get("api_key"), session)
     send_verification_code(user.get("email"), session.get("code"))
     return {"ok": True, "api_key": user.get("api_key"), "message": "We sent you a verification code on your email address", "email": user.get("email")}
 
@@ -37,30 +54,25 @@ async def login(credentials: Credentials):
 @router.post("/auth/login/verify")
 async def verify_login(code: str, session: dict = Depends(verify_authentication)):
     api_key = session.get("api_key")
-    sessions = load_data("sessions")
-    if sessions.get(api_key).get("approved"):
-        old_session_info = logout(sessions.get(api_key)).get("session_info")
+    if session.get("approved"):
+        old_session_info = (await run_blocking(logout, session)).get("session_info")
         result = await login(Credentials(**old_session_info.get("credentials")))
         return {"ok": True, "api_key": result.get("api_key"), "message": "Your previous session has been reinitialised. Please grant us the new verification code we sent you"}
-    elif not sessions.get(api_key).get("code"):
+    elif not session.get("code"):
         raise HTTPException(status_code=401, detail="Code de verification expiré. Veuillez demander un nouveau code")
-    elif sessions.get(api_key).get("code") != code:
+    elif session.get("code") != code:
         raise HTTPException(status_code=401, detail="Code de verification incorrect")
     else:
-        sessions[api_key]["approved"] = True
-        sessions[api_key]["start_time"] = now()
-        save_data(sessions, "sessions")
+        if not await run_blocking(approve_session, api_key, now()):
+            raise HTTPException(status_code=401, detail="Code de verification expiré. Veuillez demander un nouveau code")
         return {"ok": True, "message": "Successfully Authenticated"}
     
 @router.get("/auth/logout")
 def logout(session: dict = Depends(verify_authentication)):
-    sessions = load_data("sessions")
-    session_info = sessions.pop(session.get("api_key"))
-    save_data(sessions, "sessions")
-
-    users = load_data("users")
-    users[str(session_info.get("user_id"))]["api_key"] = generate_api_key()
-    save_data(users, "users")
+    session_info = close_session(session.get("api_key"))
+    if session_info is None:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    update_data("users", lambda users: users[str(session_info.get("user_id"))].update({"api_key": generate_api_key()}))
 
     return {"ok": True, "message": "Vous avez été déconnecté avec succès", "session_info": session_info}
 
@@ -70,26 +82,28 @@ def logout(session: dict = Depends(verify_authentication)):
 
 @router.post("/users/add")
 async def add_user(user_in: UserIn, authorized: bool = Depends(only_admin)):
-    tracker = load_data("tracker")
-    tracker["last_user_id"] += 1
-    save_data(tracker, "tracker")
+    new_user_id = await allocate_id_async("user")
 
-    users = load_data("users")
     user_in = user_in.dict()
     user_in["fullname"] = user_in["fullname"] or user_in["username"]
-    new_user = {"id": tracker["last_user_id"]} | user_in.dict() | {"api_key": generate_api_key(), "created_at": now(), "last_edit_at": ""} 
-    users[str(new_user.get("id"))] = new_user
-    save_data(users, "users")
+    new_user = {"id": new_user_id} | user_in | {"api_key": generate_api_key(), "created_at": now(), "last_edit_at": ""} 
+    await update_data_async("users", lambda users: users.update({str(new_user.get("id")): new_user}))
 
     return {"ok": True, "message": "User added successfully", "user": new_user}
 
-@router.get("/users")
-def get_users(authorized: bool = Depends(only_admin)):
-    users = load_data("users")
-    return {"ok": True, "users": users}
+@router.get("/users", response_model=UsersListResponse, response_class=FastJSONResponse)
+def get_users(request: Request, response: Response, authorized: bool = Depends(only_admin)):
+    version = storage.version("users")
+    etag = make_etag("users", version)
+    if not_modified := conditional(request, response, etag):
+        return not_modified
+    users = encoded.get("users", version, lambda: load_data("users"))
+    return json_response(envelope(users=users), UsersListResponse, headers=cache_headers(etag))
 
 @router.get("/profile", response_model=dict)
-def get_user_profile(session: dict = Depends(verify_authentication_approval)):
+def get_user_profile(request: Request, response: Response, session: dict = Depends(verify_authentication_approval)):
+    if not_modified := conditional(request, response, make_etag("profile", session.get("user_id"), storage.version("users"))):
+        return not_modified
     users = load_data("users")
     user_profile = users.get(str(session.get("user_id")))
     return {"ok": True, "user": user_profile}
@@ -97,32 +111,41 @@ def get_user_profile(session: dict = Depends(verify_authentication_approval)):
 @router.patch("/profile/edit")
 async def edit_profile(username: Optional[str] = Form(""), fullname: Optional[str] = Form(""), phone: Optional[str] = Form(""), profile_image: UploadFile = File(None), session: dict = Depends(verify_authentication_approval)):
     """Edit user profile information"""
-    users = load_data("users")
+    users = await load_data_async("users")
     user_id = str(session.get("user_id"))
-    user = users.get(user_id)
     
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Update fields only if provided
-    if username:
+    def check(users):
+        if not users.get(user_id):
+            raise HTTPException(status_code=404, detail="User not found")
         # Check if username is already taken by another user
-        if any(u.get("username") == username and k != user_id for k, u in users.items()):
+        if username and any(u.get("username") == username and k != user_id for k, u in users.items()):
             raise HTTPException(status_code=400, detail="Username already taken")
-        user["username"] = username
-    
-    if fullname:
-        user["fullname"] = fullname
-    
-    if phone:
-        user["phone"] = phone
+    check(users)
 
+    # Store the new image first: the user record is only touched once nothing can fail
     if profile_image:
-        user["profile_image"] = await save_profile_image(profile_image, user_id)
+        profile_image_info = await save_profile_image(profile_image, user_id)
     
-    user["last_edit_at"] = now()
-    users[user_id] = user
-    save_data(users, "users")
+    def apply(users):
+        # Checked again under the lock: another request may have changed users meanwhile
+        check(users)
+        user = users[user_id]
+        # Update fields only if provided
+        if username:
+            user["username"] = username
+        
+        if fullname:
+            user["fullname"] = fullname
+        
+        if phone:
+            user["phone"] = phone
+
+        if profile_image:
+            user["profile_image"] = profile_image_info
+
+        user["last_edit_at"] = now()
+        return user
+    user = await update_data_async("users", apply)
     
     return {"ok": True, "message": "Profile updated successfully", "user": user}
 
@@ -133,38 +156,30 @@ async def edit_profile(username: Optional[str] = Form(""), fullname: Optional[st
 # Test 
 @router.post("/post/add")
 async def add_post(text: str = Form(""), files: List[UploadFile] = File([])):
-    tracker = load_data("tracker")
-    new_post_id = tracker.get("last_post_id")+1
-    tracker["last_post_id"] = new_post_id
-    save_data(tracker, "tracker")
+    new_post_id = await allocate_id_async("post")
 
-    posts = load_data("posts")
-    
     files_info = []
-    for f in files:
-        filename = f.filename
-        files_info.append(await save_file(f, f"database/files/posts/{new_post_id}/{filename}"))
-
-    new_post = {"id": new_post_id, "content": {"text": text, "files": files_info}, "day": now("date"), "time": now("time")}
-    posts.append(new_post)
+    try:
+        budget = UploadBudget()
+        for f in files:
+            files_info.append(await save_file(f, budget))
 
-    save_data(posts, "posts")
+        new_post = {"id": new_post_id, "content": {"text": text, "files": files_info}, "day": now("date"), "time": now("time")}
+        await update_data_async("posts", lambda posts: posts.append(new_post))
+    except Exception:
+        # Nothing refers to the attachments stored so far
+        await delete_files(files_info, {f.get("id") for f in files_info})
+        raise
     return {"ok": True, "message": "Post added successfully", "post": new_post}
 
 
 
 @router.post("/reports/add")
 async def add_report(title: str = Form(...), text: Optional[str] = Form(""), date: str = Form(""), extra_fields: Optional[str] = Form(""), files: Optional[List[UploadFile]] = File([]), session: dict = Depends(verify_authentication_approval)):
-    print("\n>> Adding report...\n>> Received data:", title, text, files, sep=" - ")
-    tracker = load_data("tracker")
-    new_record_id = tracker.get("last_record_id")+1
-    tracker["last_record_id"] = new_record_id
-    save_data(tracker, "tracker")
+    logger.debug("report.add title=%r text_chars=%d files=%d", title, len(text or ""), len(files))
+    new_record_id = await allocate_id_async("record")
     
     user_id = session.get("user_id")
-    
-    # Load user's reports
-    reports = load_data("reports", user_id)
 
     try:
         current_day = datetime.strptime(date, "%d-%m-%Y").strftime("%d-%m-%Y")
@@ -174,109 +189,150 @@ async def add_report(title: str = Form(...), text: Optional[str] = Form(""), dat
         except Exception:
             current_day = now("date")
     
-    # Initialize user reports structure if empty
-    if not reports:
-        reports = {"items": {}, "user_id": user_id}
-    
-    day_report = reports.get("items", {}).get(current_day, {"records": [], "day": current_day, "validated": False, "validated_by": -1})
-    
     files_info = []
-    for f in files:
-        filename = f.filename
-        files_info.append(await save_file(f, f"database/files/reports/{new_record_id}/{filename}"))
-
-    # Parse extra_fields from JSON string
-    parsed_extra_fields = []
-    if extra_fields:
-        try:
-            import json
-            extra_data = json.loads(extra_fields)
-            if isinstance(extra_data, list):
-                parsed_extra_fields = extra_data
-            elif isinstance(extra_data, dict):
-                parsed_extra_fields = [{"key": k, "value": v} for k, v in extra_data.items()]
-        except json.JSONDecodeError:
-            pass
-
-    report_content = {"text": text, "files": files_info, "extra_fields": parsed_extra_fields}
-    new_report = {"id": new_record_id, "title": title, "content": report_content, "user_id": user_id, "day": current_day, "created_at": now("time"), "last_edit_at": ""}
-    day_report["records"].append(new_report)
-    reports["items"][current_day] = day_report
+    try:
+        budget = UploadBudget()
+        for f in files:
+            files_info.append(await save_file(f, budget))
+
+        # Parse extra_fields from JSON string
+        parsed_extra_fields = []
+        if extra_fields:
+            try:
+                import json
+                extra_data = json.loads(extra_fields)
+                if isinstance(extra_data, list):
+                    parsed_extra_fields = extra_data
+                elif isinstance(extra_data, dict):
+                    parsed_extra_fields = [{"key": k, "value": v} for k, v in extra_data.items()]
+            except json.JSONDecodeError:
+                pass
+
+        report_content = {"text": text, "files": files_info, "extra_fields": parsed_extra_fields}
+        new_report = {"id": new_record_id, "title": title, "content": report_content, "user_id": user_id, "day": current_day, "created_at": now("time"), "last_edit_at": ""}
     
-    # Save to user-specific file
-    save_data(reports, "reports", user_id)
+        # Append to the user's reports (the day is created if needed)
+        await save_record_async(new_report, user_id, current_day)
+    except Exception:
+        # Nothing refers to the attachments stored so far
+        await delete_files(files_info, {f.get("id") for f in files_info})
+        raise
+    logger.info("report.added id=%s user=%s day=%s files=%d", new_record_id, user_id, current_day, len(files_info))
     return {"ok": True, "message": "Report added successfully", "report": new_report}
 
 @router.get("/reports")
-def get_reports(session: dict = Depends(verify_authentication_approval)):
-    # validate_reports()
-    user_id = session.get("user_id")
-    api_key = session.get("api_key")
-    
-    if is_admin(api_key):
-        # Admins get all reports from all users
-        from pathlib import Path
+def get_reports(request: Request, response: Response, limit: Optional[int] = None, cursor: Optional[str] = None, user_id: Optional[int] = None, day_from: Optional[str] = None, day_to: Optional[str] = None, validated: Optional[bool] = None, title: Optional[str] = None, format: str = "json", session: dict = Depends(verify_authentication_approval), admin: bool = Depends(is_admin)):
+    """List reports.
+
+    Without any paging/filter parameter this returns the full {user_id: reports} tree.
+    With `limit`, `cursor` or a filter, it returns one page of records (with their day's
+    validation state) and a `next_cursor`; `format=ndjson` streams every matching record
+    instead, one JSON document per line."""
+    if not admin:
+        # Regular users only get their own reports
+        if user_id is not None and user_id != session.get("user_id"):
+            raise HTTPException(status_code=401, detail="Vous n'etes pas autorisé à éffectuer cette opération")
+        user_id = session.get("user_id")
+
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    filters = {"user_id": user_id, "validated": validated, "title": title} | parse_day_range(day_from, day_to)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    scope = report_owners() if user_id is None else [user_id]
+    etag = reports_etag(scope, admin, limit, cursor, user_id, day_from, day_to, validated, title, format)
+    if not_modified := conditional(request, response, etag):
+        return not_modified
+
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(after=after, limit=limit, **filters), media_type="application/x-ndjson", headers=cache_headers(etag))
+
+    if any(v is not None for v in (limit, cursor, user_id if admin else None, day_from, day_to, validated, title)):
+        items, next_cursor = page(limit or DEFAULT_PAGE_SIZE, after=after, **filters)
+        return {"ok": True, "records": items, "next_cursor": next_cursor}
+
+    if admin:
+        # Admins get all reports from all users, each user encoded once per version
         all_reports = {}
-        reports_dir = Path("database/reports")
+        for user_file_id in report_owners():
+            try:
+                user_reports = encoded_reports(user_file_id)
+                if user_reports != b"{}":
+                    all_reports[user_file_id] = user_reports
+            except Exception:
+                pass
         
-        # Iterate through all user report files
-        if reports_dir.exists():
-            for report_file in reports_dir.glob("*.json"):
-                try:
-                    user_file_id = report_file.stem
-                    user_reports = load_data("reports", user_file_id)
-                    if user_reports:
-                        all_reports[user_file_id] = user_reports
-                except Exception:
-                    pass
-        
-        return {"ok": True, "reports": all_reports}
+        return json_response(envelope(reports=mapping(all_reports)), ReportsListResponse, headers=cache_headers(etag))
     
-    # Regular users only get their own reports
-    user_reports = load_data("reports", user_id)
-    return {"ok": True, "reports": user_reports if user_reports else {}}
-
-@router.get("/reports/single")
-def get_single_report(id: int, session: dict = Depends(verify_authentication_approval)):
+    return json_response(envelope(reports=encoded_reports(user_id)), UserReportsResponse, headers=cache_headers(etag))
+
+@router.get("/reports/stats")
+def get_report_stats(request: Request, response: Response, day_from: Optional[str] = None, day_to: Optional[str] = None, authorized: bool = Depends(only_admin)):
+    """Report counts per user and per day, validated/unvalidated totals, attachment volume and last activity.
+
+    Served from aggregates kept current on every change; `day_from`/`day_to` bound the per-day counts."""
+    bounds = parse_day_range(day_from, day_to)
+    etag = reports_etag(report_owners(), "stats", day_from, day_to)
+    if not_modified := conditional(request, response, etag):
+        return not_modified
+    return {"ok": True} | report_summary(**bounds)
+
+@router.get("/reports/search")
+def search_report_records(q: str, request: Request, response: Response, user_id: Optional[int] = None, day_from: Optional[str] = None, day_to: Optional[str] = None, limit: int = 20, offset: int = 0, session: dict = Depends(verify_authentication_approval), admin: bool = Depends(is_admin)):
+    """Full-text search over titles, report text and extra field values.
+
+    Every term must match, `term*` matches a prefix; results are ranked by relevance and
+    regular users only search their own reports."""
+    if not admin:
+        if user_id is not None and user_id != session.get("user_id"):
+            raise HTTPException(status_code=401, detail="Vous n'etes pas autorisé à éffectuer cette opération")
+        user_id = session.get("user_id")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    bounds = parse_day_range(day_from, day_to)
+    if not 0 < limit <= MAX_PAGE_SIZE or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}, offset positive")
+
+    scope = report_owners() if user_id is None else [user_id]
+    etag = reports_etag(scope, "search", q, user_id, day_from, day_to, limit, offset)
+    if not_modified := conditional(request, response, etag):
+        return not_modified
+    total, records = search_reports(q, user_id, limit=limit, offset=offset, **bounds)
+    return {"ok": True, "total": total, "records": records}
+
+@router.get("/reports/single", response_model=ReportResponse, response_class=FastJSONResponse)
+def get_single_report(id: int, request: Request, response: Response, session: dict = Depends(verify_authentication_approval), admin: bool = Depends(is_admin)):
     """Get a single report by ID."""
-    # validate_reports()
     user_id = session.get("user_id")
-    api_key = session.get("api_key")
-    
-    # Admins can view any report
-    if is_admin(api_key):
-        # Search through all user report files
-        from pathlib import Path
-        reports_dir = Path("database/reports")
-        
-        if reports_dir.exists():
-            for report_file in reports_dir.glob("*.json"):
-                try:
-                    user_file_id = report_file.stem
-                    user_reports = load_data("reports", user_file_id)
-                    for day_report in user_reports.get("items", {}).values():
-                        for record in day_report.get("records", []):
-                            if record.get("id") == id:
-                                return {"ok": True, "report": record}
-                except Exception:
-                    pass
-    else:
-        # Regular users can only view their own reports
-        user_reports = load_data("reports", user_id)
-        for day_report in user_reports.get("items", {}).values():
-            for record in day_report.get("records", []):
-                if record.get("id") == id:
-                    return {"ok": True, "report": record}
+
+    headers = None
+    # Preconditions only for a report the user may see: a 304 must not reveal other users' report ids
+    if (location := locate_report(id)) and (admin or str(location[0]) == str(user_id)):
+        etag = reports_etag([location[0]], "single", id, user_id)
+        if not_modified := conditional(request, response, etag):
+            return not_modified
+        headers = cache_headers(etag)
+
+    # Admins can view any report, regular users only their own
+    if found := find_report(id):
+        owner_id, record = found
+        if admin or str(owner_id) == str(user_id):
+            return json_response(dumps({"ok": True, "report": record}), ReportResponse, headers=headers)
     
     raise HTTPException(status_code=404, detail="Report not found")
 
 @router.patch("/reports/edit")
 async def edit_report(id: int = Form(...), date: str = Form(...), title: Optional[str] = Form(""), text: Optional[str] = Form(""), extra_fields: Optional[str] = Form(""), files_to_delete: Optional[List[int]] = None, files: Optional[List[UploadFile]] = File([]), session: dict = Depends(verify_authentication_approval)):
-    print("\n>> Editing report...\n>> Received data:", id, title, text, files, sep=" - ")
+    logger.debug("report.edit id=%s day=%s title=%r text_chars=%d files=%d files_to_delete=%s", id, date, title, len(text or ""), len(files), files_to_delete)
     if files_to_delete is None:
         files_to_delete = []
     user_id = session.get("user_id")
-    reports = load_data("reports", user_id)
+    reports = await load_data_async("reports", user_id)
 
     if not reports:
         return {"ok": True, "message": "You have no reports"}
@@ -295,43 +351,52 @@ async def edit_report(id: int = Form(...), date: str = Form(...), title: Optiona
         raise HTTPException(status_code=401, detail="Invalid report index !")
     
 
-    new_files_info = await delete_files(records[record_index]["content"]["files"], set(files_to_delete))
-
-    for f in files:
-        filename = f.filename
-        new_files_info.append(await save_file(f, f"database/files/reports/{id}/{filename}"))
-
-    # Parse extra_fields from JSON string if provided
-    parsed_extra_fields = records[record_index]["content"].get("extra_fields", [])
-    if extra_fields:
-        try:
-            import json
-            extra_data = json.loads(extra_fields)
-            if isinstance(extra_data, list):
-                parsed_extra_fields = extra_data
-            elif isinstance(extra_data, dict):
-                parsed_extra_fields = [{"key": k, "value": v} for k, v in extra_data.items()]
-        except json.JSONDecodeError:
-            pass
-
-    target_report["records"][record_index]["title"] = title or records[record_index]["title"]
-    target_report["records"][record_index]["last_edit_at"] = now("time")
-    target_report["records"][record_index]["content"]["text"] = text or records[record_index]["content"]["text"]
-    target_report["records"][record_index]["content"]["files"] = new_files_info
-    target_report["records"][record_index]["content"]["extra_fields"] = parsed_extra_fields
-
-    user_reports["items"][date].update(target_report)
-
-    print("===============After edit, Reports Content===============", user_reports)
-
-    save_data(user_reports, "reports", user_id)
-    return {"ok": True, "message": "Record edited successfully", "report": target_report["records"][record_index]}
+    # Dropped attachments are released once the edited record is saved, new ones if it is not
+    to_delete = set(files_to_delete)
+    dropped = [f for f in records[record_index]["content"]["files"] if f.get("id") in to_delete]
+    new_files_info = [f for f in records[record_index]["content"]["files"] if f.get("id") not in to_delete]
+    stored = []
+    try:
+        budget = UploadBudget()
+        for f in files:
+            stored.append(await save_file(f, budget))
+        new_files_info.extend(stored)
+
+        # Parse extra_fields from JSON string if provided
+        parsed_extra_fields = records[record_index]["content"].get("extra_fields", [])
+        if extra_fields:
+            try:
+                import json
+                extra_data = json.loads(extra_fields)
+                if isinstance(extra_data, list):
+                    parsed_extra_fields = extra_data
+                elif isinstance(extra_data, dict):
+                    parsed_extra_fields = [{"key": k, "value": v} for k, v in extra_data.items()]
+            except json.JSONDecodeError:
+                pass
+
+        # Edited on a copy: the resident record only changes once the write succeeded
+        record = dict(records[record_index])
+        record["title"] = title or record["title"]
+        record["last_edit_at"] = now("time")
+        record["content"] = dict(record["content"])
+        record["content"]["text"] = text or record["content"]["text"]
+        record["content"]["files"] = new_files_info
+        record["content"]["extra_fields"] = parsed_extra_fields
+
+        await save_record_async(record, user_id, date)
+    except Exception:
+        await delete_files(stored, {f.get("id") for f in stored})
+        raise
+    await delete_files(dropped, {f.get("id") for f in dropped})
+    logger.info("report.edited id=%s user=%s day=%s files=%d", id, user_id, date, len(new_files_info))
+    return {"ok": True, "message": "Record edited successfully", "report": record}
 
 @router.delete("/reports/delete/{day:path}/{id:path}")
 async def delete_report(id: int, day: str, session: dict = Depends(verify_authentication_approval)):
-    print("Deleting ", day, "/", id)
+    logger.debug("report.delete id=%s day=%s", id, day)
     user_id = session.get("user_id")
-    reports = load_data("reports", user_id)
+    reports = await load_data_async("reports", user_id)
 
     if not reports:
         return {"ok": True, "message": "You have no reports"}
@@ -341,32 +406,42 @@ async def delete_report(id: int, day: str, session: dict = Depends(verify_authen
     
     if record_index == -1:
         raise HTTPException(status_code=401, detail="Invalid report index !")
-    print("ndex: ", record_index)
-
-    print("===================================================")
-    print("Reports:", reports["items"][day]["records"])
-    deleted_record = reports["items"][day]["records"].pop(record_index)
-    print("===================================================")
-    print("Deleted Record:", deleted_record)
-    if deleted_record.get("content").get("files"):
-        res = await delete_dir(f"database/files/reports/{id}")
-        if not res.get("ok"):
-            raise HTTPException(status_code=401, detail = "An error occured while attempting to delete report")
-    
-    save_data(reports, "reports", user_id)
+    deleted_record = reports["items"][day]["records"][record_index]
+    await delete_record_async(user_id, day, id)
+
+    # Attachments are released only once the record is gone
+    if files := deleted_record.get("content").get("files"):
+        await delete_files(files, {f.get("id") for f in files})
+        # Attachments stored before the blob store lived in a per-record folder
+        await delete_dir(f"database/files/reports/{id}")
+    logger.info("report.deleted id=%s user=%s day=%s", id, user_id, day)
     return {"ok": True, "message": "Record deleted successfully", "report": deleted_record}
 
-@router.get("/files/{path:path}")
-async def get_protected_file(path: str, session: dict = Depends(verify_authentication_approval)):
-    full_path = Path("database/files").joinpath(path)
-
-    if ".." in path:
-        raise HTTPException(status_code=400, detail="Invalid path")
+@router.post("/reports/batch")
+async def batch_reports(batch: BatchRequest, session: dict = Depends(verify_authentication_approval), admin: bool = Depends(is_admin)):
+    """Apply several report operations at once: create, edit, delete and, for admins, validate_days.
+
+    Each user's operations are applied with a single read and a single write of their reports,
+    all or nothing; `results` has one entry per operation, in order."""
+    if not batch.operations:
+        raise HTTPException(status_code=400, detail="No operations")
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    if not admin and any(op.op == "validate_days" for op in batch.operations):
+        raise HTTPException(status_code=401, detail="Vous n'etes pas autorisé à éffectuer cette opération")
+    results, released = await run_blocking(run_batch, [op.model_dump() for op in batch.operations], session.get("user_id"))
+    if released:
+        await delete_files(released, {f.get("id") for f in released})
+    for result in results:
+        if result["ok"] and result["op"] == "delete" and (result["report"].get("content") or {}).get("files"):
+            # Attachments stored before the blob store lived in a per-record folder
+            await delete_dir(f"database/files/reports/{result['report']['id']}")
+    return {"ok": all(result["ok"] for result in results), "results": results}
 
-    if not Path(full_path).exists():
-        raise HTTPException(status_code=404, detail="File not found")
-
-    return FileResponse(full_path)
+@router.get("/files/{path:path}")
+def get_protected_file(path: str, request: Request, size: Optional[str] = None, session: dict = Depends(verify_authentication_approval)):
+    """The file, or with `size` (small, medium, large) its image thumbnail or PDF first-page preview."""
+    return serve_file(request, path, size)
 
 
 # -------------------------------------------
@@ -377,41 +452,35 @@ async def get_protected_file(path: str, session: dict = Depends(verify_authentic
 async def reset_database(authorized: bool = Depends(only_admin)):
     """Reset all database files to empty state. Admin only."""
     try:
-        import json
-        from datetime import datetime
-        from pathlib import Path
-        
         # Initialize empty data structures
-        tracker = load_data("tracker")
+        # (users are kept, so their ids keep counting)
         n_tracker = {
-            "last_user_id": 0,
             "last_post_id": 0,
             "last_record_id": 0,
             "last_file_id": 0,
         }
-        tracker.update(n_tracker)
         # users = {}
         sessions = {}
         posts = []
         
         # Save all reset data
-        save_data(tracker, "tracker")
+        # Workers drop the id blocks they reserved before the reset when they see the new epoch
+        await update_data_async("tracker", lambda tracker: tracker.update(n_tracker, reset_epoch=tracker.get("reset_epoch", 0) + 1))
         # save_data(users, "users")
-        save_data(sessions, "sessions")
-        save_data(posts, "posts")
+        await save_data_async(sessions, "sessions")
+        await save_data_async(posts, "posts")
         
         # Clear all per-user report files
-        reports_dir = Path("database/reports")
-        if reports_dir.exists():
-            for report_file in reports_dir.glob("*.json"):
-                try:
-                    report_file.unlink()
-                except Exception:
-                    pass
+        for user_file_id in await run_blocking(report_owners):
+            try:
+                await delete_data_async("reports", user_file_id)
+            except Exception:
+                pass
         
         # Clear file directories
         await delete_dir("database/files/posts")
         await delete_dir("database/files/reports")
+        await delete_dir("database/files/blobs")
 
         
         return {
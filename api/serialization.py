@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from fastapi.responses import Response
+import json, logging, threading
+
+from api.settings import section
+
+try:
+    import orjson
+except ImportError:  # optional: the standard encoder is used instead
+    orjson = None
+
+# -------------------------------------------------
+# Fast JSON responses
+# -------------------------------------------------
+# Large listings (users, the admin report tree) skip FastAPI's jsonable_encoder
+# and are encoded once per collection version: the bytes are cached and reused
+# until the collection changes, and the admin tree is assembled from per-user
+# fragments so a change only re-encodes the user it touched. orjson is used
+# when installed.
+#
+# The pydantic models of api/models.py are not run on these responses; with
+# `serialization.validate_responses` (meant for development) every encoded
+# response is validated against its model and a mismatch fails the request.
+
+_settings = section("serialization")
+VALIDATE_RESPONSES = _settings.get("validate_responses", False)
+CACHE_BYTES = int(_settings.get("cache_mb", 64) * 1024 * 1024)
+
+logger = logging.getLogger("api.serialization")
+
+
+def dumps(data):
+    """Compact UTF-8 JSON encoding of `data`."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered without jsonable_encoder; `content` may already be encoded bytes."""
+    media_type = "application/json"
+
+    def render(self, content):
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+class EncodedCache:
+    """Encoded documents kept as long as the version they were built for, within a byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (version, payload), least recently used first
+        self.size = 0
+
+    def get(self, key, version, build):
+        """The bytes of `key` at `version`, encoding `build()` (unless it gives bytes) if they are not cached."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1]
+        payload = build()
+        if not isinstance(payload, bytes):
+            payload = dumps(payload)
+        with self.lock:
+            if (old := self.entries.pop(key, None)) is not None:
+                self.size -= len(old[1])
+            if len(payload) <= self.max_bytes:
+                self.entries[key] = (version, payload)
+                self.size += len(payload)
+                while self.size > self.max_bytes:
+                    _, (_, evicted) = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return payload
+
+encoded = EncodedCache(CACHE_BYTES)
+
+
+def json_response(payload, model=None, headers=None):
+    """A FastJSONResponse of encoded `payload`, validated against `model` when enabled."""
+    if VALIDATE_RESPONSES and model is not None:
+        # Raises (500) on a mismatch: this is a development check
+        model.model_validate_json(payload)
+    return FastJSONResponse(payload, headers=headers)
+
+def envelope(**fields):
+    """Encode {"ok": true, name: fragment...} from already encoded fragments."""
+    return b'{"ok":true,' + b",".join(dumps(name) + b":" + fragment for name, fragment in fields.items()) + b"}"
+
+def mapping(fragments):
+    """Encode a JSON object from {key: encoded value}."""
+    return b"{" + b",".join(dumps(str(key)) + b":" + fragment for key, fragment in fragments.items()) + b"}"
@@ -0,0 +1,91 @@
+from datetime import datetime
+import logging, time
+
+from api import storage
+from api.settings import section
+
+# -------------------------------------------------
+# Session store
+# -------------------------------------------------
+# Sessions are keyed by api_key in the resident `sessions` collection, so a
+# lookup is a dict access. Each change is a single entry written with
+# storage.put_item/delete_item (a journal line on the JSON backend, a row on
+# SQLite) instead of a rewrite of every session.
+#
+# A session waiting for its verification code lives `code_ttl_seconds`, an
+# approved one `ttl_seconds` (0 disables either). Expired sessions are dropped
+# when they are accessed, and by the periodic `purge` which also compacts the
+# journal.
+
+_settings = section("sessions")
+CODE_TTL_SECONDS = _settings.get("code_ttl_seconds", 600)
+TTL_SECONDS = _settings.get("ttl_seconds", 7 * 24 * 3600)
+PURGE_INTERVAL_SECONDS = _settings.get("purge_interval_seconds", 300)
+
+logger = logging.getLogger("api.sessions")
+
+
+def _deadline(ttl):
+    return time.time() + ttl if ttl else None
+
+def expires_at(session):
+    """Expiry timestamp of a session, None if it does not expire."""
+    if "expires_at" in session:
+        return session["expires_at"]
+    # Sessions stored before expiry existed
+    if not session.get("approved"):
+        return 0 if CODE_TTL_SECONDS else None
+    if not TTL_SECONDS:
+        return None
+    try:
+        return datetime.strptime(session.get("start_time"), "%d-%m-%Y %H:%M:%S").timestamp() + TTL_SECONDS
+    except (TypeError, ValueError):
+        return 0
+
+def is_expired(session, now=None):
+    deadline = expires_at(session)
+    return deadline is not None and deadline <= (now or time.time())
+
+def get_session(api_key):
+    """The live session of `api_key`, or None; an expired one is removed on the way."""
+    session = storage.read("sessions").get(api_key)
+    if session is None or not is_expired(session):
+        return session
+    storage.delete_item("sessions", api_key)
+    return None
+
+def open_session(api_key, session):
+    """Store a new session waiting for its verification code."""
+    session = session | {"expires_at": _deadline(CODE_TTL_SECONDS)}
+    storage.put_item("sessions", api_key, session)
+    return session
+
+def approve_session(api_key, start_time):
+    """Mark a session as verified; its code is dropped and the approved TTL starts."""
+    if (session := get_session(api_key)) is None:
+        return None
+    session = session | {"approved": True, "start_time": start_time, "code": None, "expires_at": _deadline(TTL_SECONDS)}
+    storage.put_item("sessions", api_key, session)
+    return session
+
+def close_session(api_key):
+    """Remove a session; returns it, or None if there was none."""
+    return storage.delete_item("sessions", api_key)
+
+def purge():
+    """Remove every expired session and compact the journal; returns how many were removed."""
+    now = time.time()
+
+    def remove_expired(sessions):
+        expired = [api_key for api_key, session in sessions.items() if is_expired(session, now)]
+        for api_key in expired:
+            del sessions[api_key]
+        return len(expired)
+
+    if any(is_expired(session, now) for session in storage.read("sessions").values()):
+        # Rewriting the snapshot compacts the journal as well
+        removed = storage.update("sessions", remove_expired)
+        logger.info("Purged %d expired session(s)", removed)
+        return removed
+    storage.compact("sessions")
+    return 0
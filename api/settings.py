@@ -0,0 +1,13 @@
+from pathlib import Path
+import json
+
+# -------------------------------------------------
+# Application settings (./config.json)
+# -------------------------------------------------
+CONFIG_FILE = Path("config.json")
+
+config = json.load(open(CONFIG_FILE, "r", encoding="utf-8")) if CONFIG_FILE.exists() else {}
+
+def section(name):
+    """Return a settings section of config.json, or an empty dict when it is not configured."""
+    return config.get(name) or {}
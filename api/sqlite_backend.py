@@ -0,0 +1,374 @@
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import json, sqlite3, threading
+
+from api import metrics
+from api.storage import FSYNC, collection_key, new_day_report, new_user_reports
+
+# -------------------------------------------------
+# SQLite storage backend
+# -------------------------------------------------
+# Same interface as storage.JsonBackend, backed by a single SQLite database in
+# WAL mode. Users, sessions, days, reports and report files get their own
+# indexed tables so that a record-level change (put_record, delete_record,
+# put_day) is a single-row write instead of a rewrite of the user's history.
+# Other collections (tracker, posts...) are stored as whole JSON documents.
+#
+# Every change bumps a row of the `versions` table in the same transaction.
+# Resident copies are keyed on that version, which keeps the cache coherent
+# across processes sharing the database.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    api_key TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_api_key ON users(api_key);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    api_key TEXT PRIMARY KEY,
+    user_id INTEGER,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions(user_id);
+
+CREATE TABLE IF NOT EXISTS days (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    date TEXT,
+    validated INTEGER NOT NULL DEFAULT 0,
+    validated_by INTEGER NOT NULL DEFAULT -1,
+    UNIQUE (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS days_date ON days(date);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_user_day ON reports(user_id, day, position);
+
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    record_id INTEGER NOT NULL,
+    path TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_record_id ON files(record_id);
+
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+def _dumps(data, collection=None):
+    doc = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if collection is not None:
+        metrics.storage_bytes_written.inc(len(doc), collection=collection)
+    return doc
+
+def _loads(doc, collection):
+    metrics.storage_bytes_read.inc(len(doc), collection=collection)
+    return json.loads(doc)
+
+def _iso_date(day):
+    try:
+        return datetime.strptime(day, "%d-%m-%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+class SqliteBackend:
+    """SQLite database in WAL mode with one table per entity."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        self.lock = threading.RLock()
+        self.cache = {}  # collection key -> (version, data)
+        # Versions live in the database and are shared by every process using it
+        self.epoch = f"sqlite:{self.path}"
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        if (db := getattr(self.local, "db", None)) is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"PRAGMA synchronous={'FULL' if FSYNC else 'NORMAL'}")
+        return db
+
+    def transaction(self, write=True):
+        return _Transaction(self.db, write)
+
+    @contextmanager
+    def locked(self, object_category, user_id=None):
+        # One write transaction: other processes wait on the database lock
+        with self.lock, self.transaction():
+            yield
+
+    def _version(self, key):
+        row = self.db.execute("SELECT version FROM versions WHERE name = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, db, key):
+        db.execute("INSERT INTO versions(name, version) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET version = version + 1", (key,))
+        return self._version(key)
+
+    # Loading
+    def read(self, object_category, user_id=None):
+        key = collection_key(object_category, user_id)
+        # Writers of this process commit and update the resident copy under the same
+        # lock, so a version seen here always matches what is cached for it
+        with self.lock:
+            current = self._version(key)
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == current:
+                return cached[1]
+            with self.transaction(write=False) as db:
+                current = self._version(key)
+                data = self._load(db, object_category, user_id)
+            self.cache[key] = (current, data)
+            return data
+
+    def _load(self, db, object_category, user_id):
+        if object_category == "users":
+            return {str(id): _loads(doc, "users") for id, doc in db.execute("SELECT id, doc FROM users ORDER BY id")}
+        if object_category == "sessions":
+            return {api_key: _loads(doc, "sessions") for api_key, doc in db.execute("SELECT api_key, doc FROM sessions")}
+        if object_category == "reports" and user_id is not None:
+            days = db.execute("SELECT day, validated, validated_by FROM days WHERE user_id = ? ORDER BY seq", (int(user_id),)).fetchall()
+            if not days:
+                return {}
+            reports = new_user_reports(int(user_id))
+            for day, validated, validated_by in days:
+                reports["items"][day] = new_day_report(day) | {"validated": bool(validated), "validated_by": validated_by}
+            for day, doc in db.execute("SELECT day, doc FROM reports WHERE user_id = ? ORDER BY day, position", (int(user_id),)):
+                reports["items"][day]["records"].append(_loads(doc, "reports"))
+            return reports
+        row = db.execute("SELECT doc FROM collections WHERE name = ?", (object_category,)).fetchone()
+        return _loads(row[0], object_category) if row else {}
+
+    # Whole-collection writes
+    def write(self, data, object_category="reports", user_id=None):
+        key = collection_key(object_category, user_id)
+        with self.lock:
+            with self.transaction() as db:
+                if object_category == "users":
+                    db.execute("DELETE FROM users")
+                    db.executemany("INSERT INTO users(id, api_key, doc) VALUES (?, ?, ?)", [(int(k), u.get("api_key"), _dumps(u, "users")) for k, u in data.items()])
+                elif object_category == "sessions":
+                    db.execute("DELETE FROM sessions")
+                    db.executemany("INSERT INTO sessions(api_key, user_id, doc) VALUES (?, ?, ?)", [(k, s.get("user_id"), _dumps(s, "sessions")) for k, s in data.items()])
+                elif object_category == "reports" and user_id is not None:
+                    self._delete_user_reports(db, user_id)
+                    for day, day_report in (data or {}).get("items", {}).items():
+                        self._insert_day(db, user_id, day, day_report.get("validated", False), day_report.get("validated_by", -1))
+                        for position, record in enumerate(day_report.get("records", [])):
+                            self._insert_record(db, user_id, day, position, record)
+                else:
+                    db.execute("INSERT OR REPLACE INTO collections(name, doc) VALUES (?, ?)", (object_category, _dumps(data, object_category)))
+                version = self._bump(db, key)
+            self.cache[key] = (version, data)
+
+    def drop(self, object_category, user_id=None):
+        key = collection_key(object_category, user_id)
+        with self.lock:
+            with self.transaction() as db:
+                if object_category == "reports" and user_id is not None:
+                    self._delete_user_reports(db, user_id)
+                elif object_category in ("users", "sessions"):
+                    db.execute(f"DELETE FROM {object_category}")
+                else:
+                    db.execute("DELETE FROM collections WHERE name = ?", (object_category,))
+                self._bump(db, key)
+            self.cache.pop(key, None)
+
+    def version(self, object_category, user_id=None):
+        return self._version(collection_key(object_category, user_id))
+
+    def invalidate(self, object_category=None, user_id=None):
+        with self.lock:
+            if object_category is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(collection_key(object_category, user_id), None)
+
+    def report_user_ids(self):
+        return [str(uid) for (uid,) in self.db.execute("SELECT DISTINCT user_id FROM days ORDER BY user_id")]
+
+    # Record-level operations
+    def put_record(self, user_id, day, record):
+        key = collection_key("reports", user_id)
+        with self.lock:
+            with self.transaction() as db:
+                before = self._version(key)
+                self._insert_day(db, user_id, day, False, -1, replace=False)
+                row = db.execute("SELECT position FROM reports WHERE id = ? AND user_id = ? AND day = ?", (record["id"], int(user_id), day)).fetchone()
+                if row:
+                    position = row[0]
+                else:
+                    position = db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM reports WHERE user_id = ? AND day = ?", (int(user_id), day)).fetchone()[0]
+                self._insert_record(db, user_id, day, position, record)
+                after = self._bump(db, key)
+            self._patch_resident(key, before, after, lambda reports: self._resident_put(reports, user_id, day, record))
+
+    def delete_record(self, user_id, day, record_id):
+        key = collection_key("reports", user_id)
+        with self.lock:
+            with self.transaction() as db:
+                before = self._version(key)
+                row = db.execute("SELECT doc FROM reports WHERE id = ? AND user_id = ? AND day = ?", (record_id, int(user_id), day)).fetchone()
+                if not row:
+                    return None
+                db.execute("DELETE FROM reports WHERE id = ?", (record_id,))
+                db.execute("DELETE FROM files WHERE record_id = ?", (record_id,))
+                after = self._bump(db, key)
+            def remove(reports):
+                records = reports["items"][day]["records"]
+                records[:] = [r for r in records if r.get("id") != record_id]
+            self._patch_resident(key, before, after, remove)
+            return json.loads(row[0])
+
+    def put_day(self, user_id, day, validated, validated_by):
+        key = collection_key("reports", user_id)
+        with self.lock:
+            with self.transaction() as db:
+                before = self._version(key)
+                self._insert_day(db, user_id, day, validated, validated_by)
+                after = self._bump(db, key)
+            def update(reports):
+                day_report = reports["items"].setdefault(day, new_day_report(day))
+                day_report["validated"] = validated
+                day_report["validated_by"] = validated_by
+            self._patch_resident(key, before, after, update)
+            return self.read("reports", user_id)["items"][day]
+
+    def put_days(self, user_id, days, validated, validated_by):
+        key = collection_key("reports", user_id)
+        with self.lock:
+            with self.transaction() as db:
+                before = self._version(key)
+                for day in days:
+                    self._insert_day(db, user_id, day, validated, validated_by)
+                after = self._bump(db, key)
+            def update(reports):
+                for day in days:
+                    day_report = reports["items"].setdefault(day, new_day_report(day))
+                    day_report["validated"] = validated
+                    day_report["validated_by"] = validated_by
+            self._patch_resident(key, before, after, update)
+            items = self.read("reports", user_id)["items"]
+            return [items[day] for day in days]
+
+    # Entry-level operations on keyed collections
+    def put_item(self, object_category, item_key, value):
+        key = collection_key(object_category)
+        with self.lock:
+            if object_category not in ("users", "sessions"):
+                data = self.read(object_category)
+                data[item_key] = value
+                return self.write(data, object_category)
+            with self.transaction() as db:
+                before = self._version(key)
+                if object_category == "users":
+                    db.execute("INSERT OR REPLACE INTO users(id, api_key, doc) VALUES (?, ?, ?)", (int(item_key), value.get("api_key"), _dumps(value, "users")))
+                else:
+                    db.execute("INSERT OR REPLACE INTO sessions(api_key, user_id, doc) VALUES (?, ?, ?)", (item_key, value.get("user_id"), _dumps(value, "sessions")))
+                after = self._bump(db, key)
+            self._patch_resident(key, before, after, lambda data: data.__setitem__(item_key, value))
+
+    def delete_item(self, object_category, item_key):
+        key = collection_key(object_category)
+        with self.lock:
+            if object_category not in ("users", "sessions"):
+                data = self.read(object_category)
+                if (previous := data.pop(item_key, None)) is not None:
+                    self.write(data, object_category)
+                return previous
+            column = "id" if object_category == "users" else "api_key"
+            with self.transaction() as db:
+                before = self._version(key)
+                row = db.execute(f"SELECT doc FROM {object_category} WHERE {column} = ?", (item_key,)).fetchone()
+                if not row:
+                    return None
+                db.execute(f"DELETE FROM {object_category} WHERE {column} = ?", (item_key,))
+                after = self._bump(db, key)
+            self._patch_resident(key, before, after, lambda data: data.pop(item_key, None))
+            return json.loads(row[0])
+
+    def compact(self, object_category, user_id=None):
+        # Entries are rows: there is no journal to fold
+        return False
+
+    def compact_all(self):
+        return 0
+
+    # Helpers
+    def _patch_resident(self, key, before, after, patch):
+        """Apply a change to the resident copy if it was current, otherwise drop it."""
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == before and cached[1]:
+                patch(cached[1])
+                self.cache[key] = (after, cached[1])
+            else:
+                self.cache.pop(key, None)
+
+    @staticmethod
+    def _resident_put(reports, user_id, day, record):
+        records = reports["items"].setdefault(day, new_day_report(day))["records"]
+        index = next((i for i, r in enumerate(records) if r.get("id") == record.get("id")), -1)
+        if index == -1:
+            records.append(record)
+        else:
+            records[index] = record
+
+    def _delete_user_reports(self, db, user_id):
+        db.execute("DELETE FROM files WHERE record_id IN (SELECT id FROM reports WHERE user_id = ?)", (int(user_id),))
+        db.execute("DELETE FROM reports WHERE user_id = ?", (int(user_id),))
+        db.execute("DELETE FROM days WHERE user_id = ?", (int(user_id),))
+
+    def _insert_day(self, db, user_id, day, validated, validated_by, replace=True):
+        conflict = "DO UPDATE SET validated = excluded.validated, validated_by = excluded.validated_by" if replace else "DO NOTHING"
+        db.execute(f"INSERT INTO days(user_id, day, date, validated, validated_by) VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id, day) {conflict}", (int(user_id), day, _iso_date(day), int(bool(validated)), validated_by))
+
+    def _insert_record(self, db, user_id, day, position, record):
+        db.execute("INSERT OR REPLACE INTO reports(id, user_id, day, position, doc) VALUES (?, ?, ?, ?, ?)", (record["id"], int(user_id), day, position, _dumps(record, "reports")))
+        db.execute("DELETE FROM files WHERE record_id = ?", (record["id"],))
+        files = (record.get("content") or {}).get("files") or []
+        db.executemany("INSERT OR REPLACE INTO files(id, record_id, path, doc) VALUES (?, ?, ?, ?)", [(f.get("id"), record["id"], f.get("path"), _dumps(f)) for f in files])
+
+
+class _Transaction:
+    """BEGIN ... COMMIT/ROLLBACK around a block, reentrant per connection."""
+
+    def __init__(self, db, write):
+        self.db = db
+        self.write = write
+        self.outer = False
+
+    def __enter__(self):
+        if not self.db.in_transaction:
+            self.db.execute("BEGIN IMMEDIATE" if self.write else "BEGIN")
+            self.outer = True
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.outer:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,100 @@
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from pathlib import Path
+import hashlib, logging, mimetypes, re
+
+from api.compression import ENCODINGS, compress, negotiate
+from api.http_cache import etag_matches
+
+# -------------------------------------------------
+# Static web app
+# -------------------------------------------------
+# The files of interface/ are read once at startup (in the app's lifespan),
+# hashed, and those that compress (HTML, CSS, JavaScript, JSON, SVG) are
+# compressed with gzip and Brotli at their highest levels. Pages are rewritten
+# so that the scripts, stylesheets and images they load point to content-hashed
+# URLs (styles/view.3f2a9c1b70.css), served with a one-year immutable
+# Cache-Control: a changed file gets a new URL. Pages and plain URLs are
+# revalidated on every use (no-cache, ETag). Files added after startup are
+# served from disk.
+
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".md"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_REFERENCE = re.compile(r'(\b(?:src|href)=")(?:\./)?([^"?#:]+)(")')
+
+logger = logging.getLogger("api.static_assets")
+
+
+def _hashed_name(path, digest):
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+def _asset(content, name):
+    digest = hashlib.blake2b(content, digest_size=5).hexdigest()
+    variants = {"identity": content}
+    if Path(name).suffix in COMPRESSIBLE:
+        for encoding in ENCODINGS:
+            # Kept only when it pays off
+            if len(compressed := compress(content, encoding, brotli_quality=11, gzip_level=9)) < len(content) * 0.9:
+                variants[encoding] = compressed
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return {"digest": digest, "variants": variants, "media_type": media_type}
+
+
+class StaticAssets(StaticFiles):
+    """StaticFiles (html mode) serving preloaded, precompressed and content-hashed assets."""
+
+    def __init__(self, directory):
+        super().__init__(directory=directory, html=True)
+        self.assets = {}  # path -> asset
+        self.hashed = {}  # content-hashed path -> path
+
+    def load(self):
+        """Read, hash and compress the files of the directory (app startup); until then they are served from disk."""
+        root = Path(self.directory)
+        files = sorted(p for p in root.rglob("*") if p.is_file())
+        for path in files:
+            if path.suffix != ".html":
+                name = path.relative_to(root).as_posix()
+                self.assets[name] = asset = _asset(path.read_bytes(), name)
+                self.hashed[_hashed_name(name, asset["digest"])] = name
+        urls = {name: hashed for hashed, name in self.hashed.items()}
+        for path in files:
+            if path.suffix == ".html":
+                name = path.relative_to(root).as_posix()
+                base = Path(name).parent
+                # Pages point to the hashed URLs of what they load
+                page = _REFERENCE.sub(lambda m: m[1] + (urls.get(base.joinpath(m[2]).as_posix()) or m[2]) + m[3], path.read_text(encoding="utf-8"))
+                self.assets[name] = _asset(page.encode("utf-8"), name)
+        logger.info("Loaded %d static assets", len(self.assets))
+
+    def response(self, name, scope, immutable=False):
+        """Response for the preloaded asset `name`, in the best encoding the client accepts."""
+        asset = self.assets[name]
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""), [e for e in ENCODINGS if e in asset["variants"]])
+        etag = f'"{asset["digest"]}{"-" + encoding if encoding else ""}"'
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE if immutable else "no-cache"}
+        if len(asset["variants"]) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        body = asset["variants"][encoding or "identity"]
+        if scope["method"] == "HEAD":
+            return Response(headers=headers | {"Content-Length": str(len(body))}, media_type=asset["media_type"])
+        return Response(body, headers=headers, media_type=asset["media_type"])
+
+    async def get_response(self, path, scope):
+        if scope["method"] in ("GET", "HEAD"):
+            if path in self.hashed:
+                return self.response(self.hashed[path], scope, immutable=True)
+            name = "index.html" if path == "." else path
+            if name in self.assets:
+                return self.response(name, scope)
+        return await super().get_response(path, scope)
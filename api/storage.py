@@ -0,0 +1,697 @@
+from contextlib import contextmanager
+from pathlib import Path
+import hashlib, json, logging, os, secrets, tempfile, threading, time
+
+from api import metrics
+from api.locks import named_lock
+from api.settings import section
+
+# -------------------------------------------------
+# Storage engine
+# -------------------------------------------------
+# Every collection (users, sessions, tracker, per-user reports...) is parsed once
+# and kept resident. The objects returned by `read` are the resident copies:
+# callers that mutate them must persist their changes with `write`, or with the
+# record-level operations (put_record, delete_record, put_day(s)) which let a
+# backend apply a single report change without rewriting the user's history.
+#
+# The backend is selected with `storage.backend` in config.json:
+# - "json" (default): one JSON file per collection under database/. Reads are
+#   served from memory as long as the file still has the same mtime/size;
+#   anything edited out-of-band is reloaded.
+# - "sqlite": see api/sqlite_backend.py.
+#
+# JSON writes are crash-safe: the new content goes to a temporary file in the
+# same directory which is fsynced and atomically renamed over the old one, so a
+# file is always either its previous or its next version. With
+# `group_commit_ms` set, writes landing in the same window are coalesced by a
+# background committer (one write and fsync per file, one fsync per directory)
+# and the callers are released together once the batch is durable.
+#
+# Several worker processes can share a database: every change to a collection
+# happens under a cross-process lock on that collection (database/.locks/),
+# and read-modify-write sequences go through `update`, which re-reads the
+# collection under that lock. Resident copies are checked against the file's
+# (mtime, size, inode) stamp, and since writes replace the file, a change made
+# by another worker is always seen. Those stamps (with the journal's inode and
+# length for journaled collections) are also the collections' versions, so
+# every worker derives the same ETags from the same files.
+#
+# Collections listed in JOURNALED (sessions and the per-user reports) are
+# changed one entry at a time: put_item/delete_item and the record-level
+# operations append a line to a journal next to the file (database/<name>.journal,
+# database/reports/<user_id>.journal) instead of rewriting it, so a change costs
+# the size of the change, not of the collection. Readers replay the journal on
+# top of the snapshot (the .json file), only reading the lines they have not
+# seen yet. `compact` folds the journal back into the snapshot; it happens once
+# the journal outgrows `journal_compact_ratio` times the snapshot, and for every
+# journal each `compact_interval_seconds`, so the .json files stay usable as an
+# export. Compaction first appends a marker with the digest of the new
+# snapshot: a journal left behind by a crash after the snapshot was replaced
+# ends with the marker of that snapshot and is ignored, while a journal whose
+# snapshot was changed any other way (out-of-band edit, crash before the
+# replace) is replayed.
+
+DATABASE_DIR = Path("database")
+LOCKS_DIR = DATABASE_DIR.joinpath(".locks")
+
+_settings = section("storage")
+BACKEND = _settings.get("backend", "json")
+FSYNC = _settings.get("fsync", True)
+GROUP_COMMIT_MS = _settings.get("group_commit_ms", 0)
+JOURNALED = {"sessions"} | ({"reports"} if _settings.get("journal_reports", True) else set())
+JOURNAL_COMPACT_RATIO = _settings.get("journal_compact_ratio", 1.0)
+JOURNAL_COMPACT_MIN_BYTES = _settings.get("journal_compact_min_bytes", 256 * 1024)
+COMPACT_INTERVAL_SECONDS = _settings.get("compact_interval_seconds", 3600)
+
+logger = logging.getLogger("api.storage")
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+def collection_key(object_category, user_id=None):
+    if object_category == "reports" and user_id is not None:
+        return f"reports/{user_id}"
+    return object_category
+
+def data_path(object_category, user_id=None):
+    """Path of the JSON file backing a collection."""
+    if object_category == "reports" and user_id is not None:
+        return DATABASE_DIR.joinpath("reports", f"{user_id}.json")
+    return DATABASE_DIR.joinpath(f"{object_category}.json")
+
+def journal_path(object_category, user_id=None):
+    return data_path(object_category, user_id).with_suffix(".journal")
+
+def collection_lock(object_category, user_id=None):
+    """Cross-process lock serializing the changes of a collection (re-entrant per thread)."""
+    return named_lock(LOCKS_DIR.joinpath(f"{collection_key(object_category, user_id)}.lock"))
+
+def new_user_reports(user_id):
+    return {"items": {}, "user_id": user_id}
+
+def new_day_report(day):
+    return {"records": [], "day": day, "validated": False, "validated_by": -1}
+
+def encode(data):
+    """Compact on-disk encoding of a collection."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _digest(payload):
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def _entry_line(entry):
+    return encode(entry) + b"\n"
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # The inode changes at every atomic replace, even within the mtime granularity
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _fsync_dir(directory):
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_tmp(path, payload):
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return tmp_path
+
+def atomic_write(path, payload):
+    """Replace `path` with `payload` so that readers and crashes only ever see a complete file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(_write_tmp(path, payload), path)
+    if FSYNC:
+        _fsync_dir(path.parent)
+
+
+# Journal entries. Keyed collections: {"op": "put", "key", "value"} and
+# {"op": "del", "key"}; reports: {"op": "put_record", "day", "record"},
+# {"op": "delete_record", "day", "id"} and {"op": "put_days", "days",
+# "validated", "validated_by"}. Replaying an entry twice has no further effect.
+def _record_index(records, record_id):
+    return next((i for i, r in enumerate(records) if r.get("id") == record_id), -1)
+
+def _changes(data, entry):
+    """False for a removal of something that is not there."""
+    if entry["op"] == "del":
+        return entry["key"] in data
+    if entry["op"] == "delete_record":
+        return _record_index(data.get("items", {}).get(entry["day"], {}).get("records", []), entry["id"]) != -1
+    return True
+
+def _apply(data, entry):
+    """Apply a journal entry to a collection; returns what was replaced, removed or changed."""
+    op = entry.get("op")
+    if op == "put":
+        previous = data.get(entry["key"])
+        data[entry["key"]] = entry["value"]
+        return previous
+    if op == "del":
+        return data.pop(entry["key"], None)
+    if op == "put_record":
+        day, record = entry["day"], entry["record"]
+        records = data.setdefault("items", {}).setdefault(day, new_day_report(day))["records"]
+        index = _record_index(records, record.get("id"))
+        if index == -1:
+            records.append(record)
+            return None
+        previous, records[index] = records[index], record
+        return previous
+    if op == "delete_record":
+        records = data.get("items", {}).get(entry["day"], {}).get("records", [])
+        index = _record_index(records, entry["id"])
+        return records.pop(index) if index != -1 else None
+    if op == "put_days":
+        day_reports = []
+        for day in entry["days"]:
+            day_report = data.setdefault("items", {}).setdefault(day, new_day_report(day))
+            day_report["validated"] = entry["validated"]
+            day_report["validated_by"] = entry["validated_by"]
+            day_reports.append(day_report)
+        return day_reports
+    return None
+
+
+class GroupCommitter:
+    """Coalesces the writes of a short window into a single durable batch."""
+
+    def __init__(self, window_ms):
+        self.window = window_ms / 1000
+        self.cond = threading.Condition()
+        self.queue = {}     # path -> latest payload
+        self.locks = []     # collection locks retained until the queued writes are flushed
+        self.taken = 0      # number of batches taken by the committer
+        self.flushed = 0    # number of batches made durable
+        self.errors = {}    # batch number -> exception
+        self.thread = None
+
+    def submit(self, path, payload, lock=None):
+        """Queue a write; returns the batch to `wait` for. A retained `lock` is released once it is flushed."""
+        with self.cond:
+            self.queue[Path(path)] = payload
+            if lock is not None:
+                self.locks.append(lock)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="storage-group-commit", daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+            return self.taken + 1
+
+    def wait(self, path, batch):
+        with self.cond:
+            while self.flushed < batch:
+                self.cond.wait()
+            if error := self.errors.get(batch):
+                raise StorageError(f"Group commit failed for {path}") from error
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+            time.sleep(self.window)
+            with self.cond:
+                queue, self.queue = self.queue, {}
+                locks, self.locks = self.locks, []
+                self.taken += 1
+                batch = self.taken
+            error = None
+            try:
+                staged = []
+                for path, payload in queue.items():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    staged.append((_write_tmp(path, payload), path))
+                for tmp_path, path in staged:
+                    os.replace(tmp_path, path)
+                if FSYNC:
+                    for directory in {path.parent for path in queue}:
+                        _fsync_dir(directory)
+            except Exception as e:
+                logger.exception("Group commit of %d file(s) failed", len(queue))
+                error = e
+            for lock in locks:
+                lock.unretain()
+            with self.cond:
+                if error is not None:
+                    self.errors[batch] = error
+                self.errors.pop(batch - 16, None)
+                self.flushed = batch
+                self.cond.notify_all()
+
+
+class JsonBackend:
+    """One JSON document per collection under database/, kept resident in memory."""
+
+    def __init__(self, group_commit_ms=0):
+        self.lock = threading.RLock()
+        self.cache = {}     # collection key -> (stamp, data)
+        self.versions = {}  # collection key -> number of group-committed writes, for versions not on disk yet
+        self.pending = {}   # collection key -> number of writes queued in the group committer
+        self.digests = {}   # collection key -> digest of the snapshot (journaled collections)
+        self.stale = set()  # collection keys whose journal is already in their snapshot
+        self.committer = GroupCommitter(group_commit_ms) if group_commit_ms else None
+        self.local = threading.local()  # collection locks held and group commits to wait for, per thread
+        # Versions come from the files, the same in every worker sharing the database
+        self.epoch = "json"
+        # Scope of the per-process counters used while a write is not on disk yet
+        self.token = secrets.token_hex(8)
+
+    def _resolve_path(self, object_category, user_id=None):
+        path = data_path(object_category, user_id)
+        if path.exists() or object_category == "reports":
+            return path
+        # Legacy layout: fall back to the most recent `{category}_*.json` export
+        if files := sorted(DATABASE_DIR.glob(f"{object_category}_*.json"), reverse=True):
+            return files[0]
+        return path
+
+    def read(self, object_category, user_id=None):
+        key = collection_key(object_category, user_id)
+        path = self._resolve_path(object_category, user_id)
+        with self.lock:
+            # Stat under the lock: a stamp taken before a concurrent write would look
+            # like an out-of-band change and replace the resident copy being mutated.
+            stamp = _stamp(path)
+            cached = self.cache.get(key)
+            if object_category in JOURNALED:
+                return self._read_journaled(key, journal_path(object_category, user_id), path, stamp, cached, object_category)
+            if cached is not None and (cached[0] == stamp or self.pending.get(key)):
+                return cached[1]
+            data = self._load(key, path, stamp, object_category)
+            self.cache[key] = (stamp, data)
+            return data
+
+    def _load(self, key, path, stamp, object_category):
+        if stamp is None:
+            self.digests.pop(key, None)
+            return {}
+        metrics.storage_bytes_read.inc(stamp[1], collection=object_category)
+        with open(path, "rb") as f:
+            payload = f.read()
+        try:
+            data = json.loads(payload)
+        except ValueError as e:
+            # Never hand out an empty collection for a damaged file: the next
+            # save would silently erase everything it contained.
+            logger.error("Corrupted data file %s: %s", path, e)
+            raise StorageError(f"Corrupted data file {path}") from e
+        if object_category in JOURNALED:
+            self.digests[key] = _digest(payload)
+        return data
+
+    def _read_journaled(self, key, journal, path, stamp, cached, object_category):
+        # Resident copies of journaled collections are stamped with
+        # (snapshot stamp, journal inode, journal bytes already applied)
+        journal_stamp = _stamp(journal)
+        if cached is not None:
+            (snapshot, inode, offset), data = cached
+            if snapshot == stamp:
+                if (journal_stamp is None and offset == 0) or (journal_stamp is not None and journal_stamp[2] == inode and journal_stamp[1] == offset):
+                    return data
+                if journal_stamp is not None and (journal_stamp[2] == inode or offset == 0) and journal_stamp[1] > offset:
+                    # Only the entries appended since (by this or another worker)
+                    self.cache[key] = ((stamp,) + self._replay(key, journal, data, offset, object_category), data)
+                    return data
+        data = self._load(key, path, stamp, object_category)
+        self.cache[key] = ((stamp,) + self._replay(key, journal, data, 0, object_category), data)
+        return data
+
+    def _replay(self, key, journal, data, offset, object_category):
+        """Apply the journal from `offset` to `data`; returns (journal inode, offset reached)."""
+        if offset == 0:
+            self.stale.discard(key)
+        try:
+            f = open(journal, "rb")
+        except FileNotFoundError:
+            return None, 0
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            chunk = f.read()
+        # A line still being written (or torn by a crash) is left for later
+        end = chunk.rfind(b"\n") + 1
+        metrics.storage_bytes_read.inc(end, collection=object_category)
+        entries = []
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping a damaged line of %s", journal)
+        if entries and entries[-1].get("op") == "compacted" and entries[-1].get("snapshot") == self.digests.get(key):
+            # Left behind by a crash while compacting: already in the snapshot
+            logger.warning("Ignoring %s, it was folded into the current snapshot", journal)
+            self.stale.add(key)
+            return inode, offset + end
+        for entry in entries:
+            _apply(data, entry)
+        return inode, offset + end
+
+    @contextmanager
+    def locked(self, object_category, user_id=None):
+        local = self.local
+        if not hasattr(local, "depth"):
+            local.depth, local.commits = 0, []
+        with collection_lock(object_category, user_id):
+            local.depth += 1
+            try:
+                yield
+            finally:
+                local.depth -= 1
+        if not local.depth and local.commits:
+            self._await_commits()
+
+    def write(self, data, object_category="reports", user_id=None):
+        with self.locked(object_category, user_id):
+            self._write(data, object_category, user_id)
+
+    def _write(self, data, object_category, user_id):
+        key = collection_key(object_category, user_id)
+        path = data_path(object_category, user_id)
+        if object_category in JOURNALED:
+            # A new snapshot supersedes the journal
+            journal = journal_path(object_category, user_id)
+            with self.lock:
+                try:
+                    payload = encode(data)
+                    if journal.exists():
+                        self._append(journal, {"op": "compacted", "snapshot": _digest(payload)}, object_category)
+                    metrics.storage_bytes_written.inc(len(payload), collection=object_category)
+                    atomic_write(path, payload)
+                    journal.unlink(missing_ok=True)
+                except BaseException:
+                    self.cache.pop(key, None)
+                    raise
+                self.cache[key] = ((_stamp(path), None, 0), data)
+                self.digests[key] = _digest(payload)
+                self.stale.discard(key)
+            return
+        if self.committer is None:
+            with self.lock:
+                try:
+                    payload = encode(data)
+                    metrics.storage_bytes_written.inc(len(payload), collection=object_category)
+                    atomic_write(path, payload)
+                except BaseException:
+                    self.cache.pop(key, None)
+                    raise
+                self.cache[key] = (_stamp(path), data)
+            return
+
+        lock = collection_lock(object_category, user_id)
+        with self.lock:
+            payload = encode(data)
+            metrics.storage_bytes_written.inc(len(payload), collection=object_category)
+            self.cache[key] = (None, data)
+            self.pending[key] = self.pending.get(key, 0) + 1
+            self.versions[key] = self.versions.get(key, 0) + 1
+            # Other processes stay locked out until the write is flushed
+            lock.retain()
+            batch = self.committer.submit(path, payload, lock)
+        # Waited for once the thread leaves its collection locks (see `locked`), so that
+        # writes to the same collection from other threads can join the batch meanwhile
+        self.local.commits.append((key, path, batch))
+
+    def _await_commits(self):
+        commits, self.local.commits = self.local.commits, []
+        error = None
+        for key, path, batch in commits:
+            try:
+                self.committer.wait(path, batch)
+            except StorageError as e:
+                error = e
+            finally:
+                with self.lock:
+                    self.pending[key] -= 1
+                    if not self.pending[key]:
+                        del self.pending[key]
+                        if (cached := self.cache.get(key)) is not None:
+                            self.cache[key] = (_stamp(path), cached[1])
+        if error is not None:
+            raise error
+
+    def drop(self, object_category, user_id=None):
+        key = collection_key(object_category, user_id)
+        with self.locked(object_category, user_id), self.lock:
+            data_path(object_category, user_id).unlink(missing_ok=True)
+            journal_path(object_category, user_id).unlink(missing_ok=True)
+            self.cache.pop(key, None)
+            self.digests.pop(key, None)
+            self.stale.discard(key)
+
+    def version(self, object_category, user_id=None):
+        key = collection_key(object_category, user_id)
+        self.read(object_category, user_id)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is None or self.pending.get(key):
+                # Queued in the group committer: only this process knows the change
+                return (self.token, self.versions.get(key, 0))
+            # The stamp of the file (and of the journal, with the bytes applied): every
+            # worker sees the same one for the same content; 0 for a missing file
+            return cached[0] or 0
+
+    def invalidate(self, object_category=None, user_id=None):
+        with self.lock:
+            if object_category is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(collection_key(object_category, user_id), None)
+
+    def report_user_ids(self):
+        reports_dir = DATABASE_DIR.joinpath("reports")
+        return sorted((p.stem for p in reports_dir.glob("*.json")), key=lambda s: (len(s), s)) if reports_dir.exists() else []
+
+    # Entry-level operations on keyed collections
+    def put_item(self, object_category, item_key, value):
+        self._change(object_category, None, {"op": "put", "key": item_key, "value": value})
+
+    def delete_item(self, object_category, item_key):
+        return self._change(object_category, None, {"op": "del", "key": item_key})
+
+    # Record-level operations on the reports of a user
+    def put_record(self, user_id, day, record):
+        self._change("reports", user_id, {"op": "put_record", "day": day, "record": record})
+
+    def delete_record(self, user_id, day, record_id):
+        return self._change("reports", user_id, {"op": "delete_record", "day": day, "id": record_id})
+
+    def put_day(self, user_id, day, validated, validated_by):
+        return self.put_days(user_id, [day], validated, validated_by)[0]
+
+    def put_days(self, user_id, days, validated, validated_by):
+        return self._change("reports", user_id, {"op": "put_days", "days": list(days), "validated": validated, "validated_by": validated_by})
+
+    def _change(self, object_category, user_id, entry):
+        key = collection_key(object_category, user_id)
+        with self.locked(object_category, user_id):
+            # Under the collection lock the resident copy is brought up to date first
+            data = self.read(object_category, user_id)
+            if not _changes(data, entry):
+                return None
+            snapshot = self.cache[key][0][0] if object_category in JOURNALED else None
+            if object_category == "reports" and not data:
+                # New (or empty) report collections are written whole, with their header
+                data.update(new_user_reports(user_id))
+                snapshot = None
+            if snapshot is None or key in self.stale:
+                # Not journaled, or no snapshot yet for the journal to apply to: write it whole
+                result = _apply(data, entry)
+                self._write(data, object_category, user_id)
+                return result
+            # Applied first: a reader replaying the new line before we are done finds it already there
+            with self.lock:
+                result = _apply(data, entry)
+            try:
+                inode, size = self._append(journal_path(object_category, user_id), entry, object_category)
+            except BaseException:
+                self.invalidate(object_category, user_id)
+                raise
+            with self.lock:
+                if (cached := self.cache.get(key)) is not None and cached[1] is data:
+                    self.cache[key] = ((cached[0][0], inode, size), data)
+            if size > max(JOURNAL_COMPACT_MIN_BYTES, snapshot[1] * JOURNAL_COMPACT_RATIO):
+                self._write(data, object_category, user_id)
+            return result
+
+    @staticmethod
+    def _append(path, entry, object_category):
+        line = _entry_line(entry)
+        with open(path, "a+b") as f:
+            created = not f.seek(0, os.SEEK_END)
+            if not created:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a line torn by a crash so that it is skipped, not merged
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+            inode, size = os.fstat(f.fileno()).st_ino, f.tell()
+        if created and FSYNC:
+            _fsync_dir(path.parent)
+        metrics.storage_bytes_written.inc(len(line), collection=object_category)
+        return inode, size
+
+    def compact(self, object_category, user_id=None):
+        with self.locked(object_category, user_id):
+            if object_category in JOURNALED and journal_path(object_category, user_id).exists():
+                # The content does not change, but the files do: readers get a new version
+                self._write(self.read(object_category, user_id), object_category, user_id)
+                return True
+            return False
+
+    def compact_all(self):
+        compacted = sum(self.compact(category) for category in JOURNALED - {"reports"})
+        if "reports" in JOURNALED and (reports_dir := DATABASE_DIR.joinpath("reports")).exists():
+            compacted += sum(self.compact("reports", p.stem) for p in reports_dir.glob("*.journal"))
+        return compacted
+
+
+def _create_backend():
+    if BACKEND == "sqlite":
+        from api.sqlite_backend import SqliteBackend
+        return SqliteBackend(_settings.get("sqlite_path", str(DATABASE_DIR.joinpath("reports.db"))))
+    if BACKEND != "json":
+        raise StorageError(f"Unknown storage backend {BACKEND!r}")
+    return JsonBackend(GROUP_COMMIT_MS)
+
+backend = _create_backend()
+
+# Report change listeners: called as listener(event, user_id, day, record) after
+# a change has been persisted through this module. Events are "put_record",
+# "delete_record", "put_day" (record is the day report), "write" and "drop"
+# (a user's whole report collection was replaced or removed).
+_listeners = []
+
+def subscribe(listener):
+    _listeners.append(listener)
+    return listener
+
+def _notify(event, user_id, day=None, record=None):
+    for listener in _listeners:
+        try:
+            listener(event, user_id, day, record)
+        except Exception:
+            logger.exception("Report listener %r failed on %s", listener, event)
+
+
+def read(object_category, user_id=None):
+    """Return the resident copy of a collection, (re)loading it if it changed."""
+    with metrics.storage_latency.time(operation="read", collection=object_category):
+        return backend.read(object_category, user_id)
+
+def write(data, object_category="reports", user_id=None):
+    """Write a collection through to the backend and make it the resident copy."""
+    with metrics.storage_latency.time(operation="write", collection=object_category):
+        backend.write(data, object_category, user_id)
+    if object_category == "reports" and user_id is not None:
+        _notify("write", user_id)
+
+def update(object_category, fn, user_id=None):
+    """Read-modify-write a collection, atomically across threads and worker processes.
+
+    `fn` gets the current resident copy, changes it in place and may return a
+    result, which is passed on. If it raises, nothing is written."""
+    with backend.locked(object_category, user_id):
+        data = read(object_category, user_id)
+        try:
+            result = fn(data)
+        except BaseException:
+            # The resident copy may be half-changed: reload it on next read
+            backend.invalidate(object_category, user_id)
+            raise
+        write(data, object_category, user_id)
+    return result
+
+def drop(object_category, user_id=None):
+    """Delete a collection altogether."""
+    backend.drop(object_category, user_id)
+    if object_category == "reports" and user_id is not None:
+        _notify("drop", user_id)
+
+def version(object_category, user_id=None):
+    """Change counter of a collection; moves whenever its content may have changed."""
+    return backend.version(object_category, user_id)
+
+def epoch():
+    """Scope in which versions are comparable (they are not across epochs)."""
+    return backend.epoch
+
+def invalidate(object_category=None, user_id=None):
+    """Drop resident copies so the next read goes back to the backend."""
+    backend.invalidate(object_category, user_id)
+
+def report_user_ids():
+    """Ids (as strings) of the users that have a report collection."""
+    return backend.report_user_ids()
+
+def put_record(user_id, day, record):
+    """Insert or replace (by id) a record of a user's day, creating the day if needed."""
+    with metrics.storage_latency.time(operation="put_record", collection="reports"):
+        backend.put_record(user_id, day, record)
+    _notify("put_record", user_id, day, record)
+
+def delete_record(user_id, day, record_id):
+    """Remove a record from a user's day; returns it, or None if it did not exist."""
+    with metrics.storage_latency.time(operation="delete_record", collection="reports"):
+        record = backend.delete_record(user_id, day, record_id)
+    if record is not None:
+        _notify("delete_record", user_id, day, record)
+    return record
+
+def put_day(user_id, day, validated, validated_by):
+    """Set the validation state of a user's day, creating the day if needed."""
+    with metrics.storage_latency.time(operation="put_day", collection="reports"):
+        day_report = backend.put_day(user_id, day, validated, validated_by)
+    _notify("put_day", user_id, day, day_report)
+    return day_report
+
+def put_days(user_id, days, validated, validated_by):
+    """Set the validation state of several days of a user in a single write."""
+    with metrics.storage_latency.time(operation="put_days", collection="reports"):
+        day_reports = backend.put_days(user_id, days, validated, validated_by)
+    for day, day_report in zip(days, day_reports):
+        _notify("put_day", user_id, day, day_report)
+    return day_reports
+
+def put_item(object_category, item_key, value):
+    """Insert or replace one entry of a keyed collection (sessions, users) without rewriting the rest."""
+    with metrics.storage_latency.time(operation="put_item", collection=object_category):
+        backend.put_item(object_category, item_key, value)
+
+def delete_item(object_category, item_key):
+    """Remove one entry of a keyed collection; returns it, or None if it did not exist."""
+    with metrics.storage_latency.time(operation="delete_item", collection=object_category):
+        return backend.delete_item(object_category, item_key)
+
+def compact(object_category, user_id=None):
+    """Fold the journal of a collection into its snapshot; True if there was one."""
+    with metrics.storage_latency.time(operation="compact", collection=object_category):
+        return backend.compact(object_category, user_id)
+
+def compact_all():
+    """Compact every journal; returns how many there were."""
+    return backend.compact_all()
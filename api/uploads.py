@@ -0,0 +1,144 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from pathlib import Path
+import hashlib, os, tempfile, time
+
+from api import blobs, metrics
+from api.blocking import run_blocking
+from api.settings import section
+
+# -------------------------------------------------
+# Streaming upload pipeline
+# -------------------------------------------------
+# Uploads are copied chunk by chunk to a temporary file next to their
+# destination, hashed on the fly, and renamed into place once complete. File
+# writes and hashing run on the I/O pool; size caps are enforced per file and
+# per request while streaming, so an oversized upload is rejected without
+# ever being held in memory. Multipart requests that announce a Content-Length
+# above the per-request cap are rejected before their body is read at all.
+#
+# Attachments go to the content-addressed blob store (api/blobs.py): the
+# upload is hashed first, and only written if no blob has that content yet.
+
+_settings = section("uploads")
+CHUNK_BYTES = _settings.get("chunk_bytes", 1024 * 1024)
+MAX_FILE_BYTES = _settings.get("max_file_bytes", 50 * 1024 * 1024)
+MAX_REQUEST_BYTES = _settings.get("max_request_bytes", 200 * 1024 * 1024)
+# Room for the other form fields and the multipart framing around the files
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadBudget:
+    """Bytes still allowed for the uploads of one request."""
+
+    def __init__(self, max_bytes=MAX_REQUEST_BYTES):
+        self.remaining = max_bytes
+
+    def consume(self, n):
+        self.remaining -= n
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail=f"Request uploads exceed {MAX_REQUEST_BYTES} bytes")
+
+
+class UploadLimitMiddleware:
+    """Answer 413 to multipart requests whose Content-Length exceeds the per-request cap, unread."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if headers.get("content-type", "").startswith("multipart/form-data"):
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = 0
+                if length > MAX_REQUEST_BYTES + FORM_OVERHEAD_BYTES:
+                    response = JSONResponse({"detail": f"Request uploads exceed {MAX_REQUEST_BYTES} bytes"}, status_code=413)
+                    return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+def _open_tmp(dest):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{dest.name}.", suffix=".part", dir=dest.parent)
+    return os.fdopen(fd, "wb"), tmp_path
+
+def _write_chunk(out, digest, chunk):
+    out.write(chunk)
+    digest.update(chunk)
+
+def _finish(out, tmp_path, dest):
+    out.close()
+    os.replace(tmp_path, dest)
+
+def _abort(out, tmp_path):
+    out.close()
+    Path(tmp_path).unlink(missing_ok=True)
+
+
+async def receive_upload(upload: UploadFile, dest, kind, budget: UploadBudget = None):
+    """Stream `upload` to `dest`, measured under `kind`; returns (size in bytes, sha256 hex digest)."""
+    dest = Path(dest)
+    start = time.perf_counter()
+    out, tmp_path = await run_blocking(_open_tmp, dest)
+    digest, size = hashlib.sha256(), 0
+    try:
+        while chunk := await upload.read(CHUNK_BYTES):
+            size += len(chunk)
+            if size > MAX_FILE_BYTES:
+                raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds {MAX_FILE_BYTES} bytes")
+            if budget is not None:
+                budget.consume(len(chunk))
+            await run_blocking(_write_chunk, out, digest, chunk)
+        await run_blocking(_finish, out, tmp_path, dest)
+    except BaseException:
+        await run_blocking(_abort, out, tmp_path)
+        raise
+    metrics.upload_bytes.inc(size, kind=kind)
+    metrics.upload_latency.observe(time.perf_counter() - start, kind=kind)
+    return size, digest.hexdigest()
+
+
+def _hash_stream(fileobj, filename, budget):
+    fileobj.seek(0)
+    digest, size = hashlib.sha256(), 0
+    while chunk := fileobj.read(CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_FILE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{filename} exceeds {MAX_FILE_BYTES} bytes")
+        if budget is not None:
+            budget.consume(len(chunk))
+        digest.update(chunk)
+    fileobj.seek(0)
+    return size, digest.hexdigest()
+
+def _stage(fileobj, dest):
+    out, tmp_path = _open_tmp(dest)
+    try:
+        while chunk := fileobj.read(CHUNK_BYTES):
+            out.write(chunk)
+    except BaseException:
+        _abort(out, tmp_path)
+        raise
+    out.close()
+    return tmp_path
+
+def _store_attachment(fileobj, filename, file_id, budget):
+    size, sha256 = _hash_stream(fileobj, filename, budget)
+    ext = filename.split(".")[-1] if "." in filename else ""
+    if blobs.find_blob(sha256) is None or (path := blobs.add_reference(sha256, file_id)) is None:
+        staged = _stage(fileobj, blobs.blob_path(sha256, ext))
+        path = blobs.add_reference(sha256, file_id, staged, ext)
+    return Path(path).as_posix(), size, sha256
+
+
+async def store_attachment(upload: UploadFile, file_id, budget: UploadBudget = None):
+    """Store `upload` in the blob store as file `file_id`; returns (path, size, sha256)."""
+    start = time.perf_counter()
+    path, size, sha256 = await run_blocking(_store_attachment, upload.file, upload.filename, file_id, budget)
+    metrics.upload_bytes.inc(size, kind="attachment")
+    metrics.upload_latency.observe(time.perf_counter() - start, kind="attachment")
+    return path, size, sha256
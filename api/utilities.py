@@ -1,127 +1,135 @@
 from datetime import datetime
 from pathlib import Path
-from fastapi import Header, HTTPException, UploadFile
+from fastapi import Depends, HTTPException, UploadFile
 import secrets, shutil
 
+from api import auto_validation, blobs, previews, storage
+from api.blocking import run_blocking
+from api.auth import resolve_auth
+from api.ids import allocate_id
+from api.serialization import encoded
+from api.uploads import UploadBudget, receive_upload, store_attachment
+
 def load_data(object_category, user_id=None):
-    """Load data from JSON file. For reports, loads user-specific file if user_id provided."""
-    if object_category == "reports" and user_id is not None:
-        # Load user-specific report file
-        data_file = f"database/reports/{user_id}.json"
-    else:
-        data_file = f"database/{object_category}.json"
+    """Load data from the storage engine. For reports, loads user-specific file if user_id provided.
 
-    if not Path(data_file).exists():
-        if object_category == "reports":
-            return {}
+    The returned object is the resident in-memory copy: persist any change with save_data."""
+    return storage.read(object_category, user_id)
 
-        if files := sorted(Path("database").glob(f"{object_category}_*.json"), reverse=True):
-            data_file = str(files[0])
-        else:
-            return {}
-    import json
-    with open(data_file, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+def encoded_reports(user_id):
+    """JSON encoding of a user's reports, cached until they change."""
+    return encoded.get(("reports", str(user_id)), storage.version("reports", user_id), lambda: load_data("reports", user_id))
 
 def save_data(data, object_category="reports", user_id=None):
-    """Save data to JSON file. For reports, saves to user-specific file if user_id provided."""
-    import json
-    
-    if object_category == "reports" and user_id is not None:
-        # Save to user-specific report file
-        data_file = f"database/reports/{user_id}.json"
-    else:
-        data_file = f"database/{object_category}.json"
-    
-    Path(data_file).parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(data_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    """Save data through the storage engine. For reports, saves to user-specific file if user_id provided."""
+    storage.write(data, object_category, user_id)
 
-async def save_file(f: UploadFile, path: str):
-    tracker = load_data("trackerr")
-    tracker["last_file_id"] = tracker["last_file_id"] + 1
-    new_file_id = tracker["last_file_id"]
-    
-    folder = Path(path).parent
-    ext = f.filename.split(".")[-1]
-    new_path = Path(folder).joinpath(f"{new_file_id}.{ext}")
-    new_path = new_path.as_posix()
+def update_data(object_category, fn, user_id=None):
+    """Change a collection in place with `fn(data)` and save it, safely against other requests and workers.
 
-    Path(folder).mkdir(parents=True, exist_ok=True)
-    with open(new_path, "wb") as out_file:
-        out_file.write(await f.read())
-    
-    save_data(tracker, "tracker")
-    return {"id": new_file_id, "name": f.filename, "type": f.content_type, "path": str(new_path)}
+    Use this rather than load_data + save_data whenever the change depends on the current content."""
+    return storage.update(object_category, fn, user_id)
+
+# Async variants for async route handlers: the work runs on the bounded I/O pool
+async def load_data_async(object_category, user_id=None):
+    return await run_blocking(load_data, object_category, user_id)
+
+async def save_data_async(data, object_category="reports", user_id=None):
+    await run_blocking(save_data, data, object_category, user_id)
+
+async def update_data_async(object_category, fn, user_id=None):
+    return await run_blocking(update_data, object_category, fn, user_id)
+
+async def save_record_async(record, user_id, day):
+    await run_blocking(save_record, record, user_id, day)
+
+async def delete_record_async(user_id, day, record_id):
+    return await run_blocking(delete_record, user_id, day, record_id)
+
+async def delete_data_async(object_category, user_id=None):
+    await run_blocking(delete_data, object_category, user_id)
+
+async def allocate_id_async(kind):
+    return await run_blocking(allocate_id, kind)
 
-async def save_profile_image(profile_image: UploadFile, user_id: int):    
+def delete_data(object_category, user_id=None):
+    """Delete a whole collection (e.g. a user's reports)."""
+    storage.drop(object_category, user_id)
+
+def report_owners():
+    """Ids of the users that have reports."""
+    return storage.report_user_ids()
+
+def save_record(record, user_id, day):
+    """Insert or replace a single report record of a user's day, creating the day if needed."""
+    storage.put_record(user_id, day, record)
+
+def delete_record(user_id, day, record_id):
+    """Remove a single report record; returns the deleted record, or None if it did not exist."""
+    return storage.delete_record(user_id, day, record_id)
+
+async def save_file(f: UploadFile, budget: UploadBudget = None):
+    """Store an attachment in the content-addressed blob store."""
+    new_file_id = await allocate_id_async("file")
+    new_path, size, sha256 = await store_attachment(f, new_file_id, budget)
+    # Thumbnails are rendered in the background; the upload does not wait for them
+    await run_blocking(previews.generate, new_path)
+    return {"id": new_file_id, "name": f.filename, "type": f.content_type, "path": new_path, "size": size, "sha256": sha256}
+
+async def save_profile_image(profile_image: UploadFile, user_id: int, budget: UploadBudget = None):    
     folder = "database/files/users/"
     ext = profile_image.filename.split(".")[-1]
     new_path = Path(folder).joinpath(f"{user_id}.{ext}")
     new_path = new_path.as_posix()
 
-    Path(folder).mkdir(parents=True, exist_ok=True)
-    with open(new_path, "wb") as out_file:
-        out_file.write(await profile_image.read())
+    size, sha256 = await receive_upload(profile_image, new_path, "profile_image", budget)
+    await run_blocking(previews.generate, new_path)
     
-    save_data(tracker, "tracker")
-    return {"name": profile_image.filename, "type": profile_image.content_type, "path": str(new_path)}
+    return {"name": profile_image.filename, "type": profile_image.content_type, "path": str(new_path), "size": size, "sha256": sha256}
+
+def release_file(f):
+    """Drop an attachment: blob references are released, legacy per-record files are removed."""
+    if f.get("sha256") and blobs.is_blob(f.get("path", "")):
+        blobs.release(f["sha256"], f.get("id"))
+    elif Path(f.get("path", "")).is_file():
+        Path(f.get("path")).unlink()
+        previews.remove(f.get("path"))
 
 async def delete_files(files, target_files):
     undeleted_files_list = []
     for f in files:
         if f.get("id") in target_files:
-            if Path(f.get("path")).exists():
-                Path(f.get("path")).unlink()
+            await run_blocking(release_file, f)
         else:
             undeleted_files_list.append(f)
     return undeleted_files_list
 
 async def delete_dir(path):
     if Path(path).exists():
-        shutil.rmtree(path)
+        await run_blocking(shutil.rmtree, path)
         return {"ok": True, "message": "Directory successfully deleted"}
     else:
         return {"ok": False, "message": "Directory not found"}
 
-def verify_api_key(x_api_key: str = Header(...)):
-    if user := next(
-        (
-            u
-            for k, u in load_data("users").items()
-            if u["api_key"] == x_api_key
-        ),
-        {},
-    ):
-        return user
-    else:
-        raise HTTPException(status_code=401, detail="Invalid API Key")
+def verify_api_key(auth: dict = Depends(resolve_auth)):
+    return auth["user"]
     
-def verify_authentication(x_api_key: str = Header(...)):
-    verify_api_key(x_api_key)
-    if session := load_data("sessions").get(x_api_key):
+def verify_authentication(auth: dict = Depends(resolve_auth)):
+    if session := auth["session"]:
         return session
     else:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-def verify_authentication_approval(x_api_key: str = Header(...)):
-    verify_authentication(x_api_key)
-    session = load_data("sessions").get(x_api_key)
+def verify_authentication_approval(session: dict = Depends(verify_authentication)):
     if not session["approved"]:
         raise HTTPException(status_code=401, detail="Authentication not yet verified. Please verify your authentication code.")
     return session
 
-def is_admin(x_api_key: str = Header(...)):
-    session = verify_authentication_approval(x_api_key)
-    user = load_data("users")[str(session.get("user_id"))]
-    return user.get("role") == "Administrator"
+def is_admin(session: dict = Depends(verify_authentication_approval), auth: dict = Depends(resolve_auth)):
+    return auth["role"] == "Administrator"
 
-def only_admin(x_api_key: str = Header(...)):
-    if not is_admin(x_api_key):
+def only_admin(admin: bool = Depends(is_admin)):
+    if not admin:
         raise HTTPException(status_code=401, detail="Vous n'etes pas autorisé à éffectuer cette opération")
 
 def generate_api_key():
@@ -139,63 +147,14 @@ def now(type: str = "datetime", d_format: str = "%d-%m-%Y %H:%M:%S"):
         d_format = "%H:%M:%S"
     return datetime.now().strftime(d_format)
 
-from datetime import datetime
-
 def validate_reports():
-    user_ids = [int(uid) for uid in load_data("users").keys()]
-    for user_id in user_ids:
-        user_reports = load_data("reports", user_id=user_id)
-        today = datetime.now().date()
-
-        for day_str, report in user_reports.get("items", {}).items():
-
-            try:
-                report_date = datetime.strptime(day_str, "%d-%m-%Y").date()
-            except ValueError:
-                continue
-
-            if (today - report_date).days >= 30 and not report.get("validated"):
-                report["validated"] = True
-                report["validated_by"] = 0
-
-        save_data(user_reports, "reports", user_id=user_id)
-
-
-    
+    # Incremental: only the days crossing the threshold are touched, see api/auto_validation.py
+    return auto_validation.run()
 
 # -------------------------------------------------
 # Automatic mails
 # -------------------------------------------------
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import json
-config = json.load(open("config.json", "r", encoding="utf-8"))
+from api.mailer import mailer, verification_message
 def send_verification_code(recipient_email, code):
-    # SMTP server details
-    smtp_server, port, sender_email, password = config.get("smtp_server"), config.get("tls_port"), config.get("admin_email"), config.get("admin_email_password")
-    # Establish connection
-    server = smtplib.SMTP(smtp_server, port)
-    # server.connect()
-    server.starttls() # Enable encryption
-    server.login(sender_email, password)
-    # Create email content
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = recipient_email
-    msg['Subject'] = "Validation Code"
-    # Add plain text and HTML content
-    html_content = f"""\
-    <html>
-    <body>
-        <h1>Validation Code</h1>
-        <p>This is your verification code: <b>{code}</b>. Don't share it to anyone.</p>
-    </body>
-    </html>
-    """
-    msg.attach(MIMEText(html_content, 'html'))
-
-    # Send the email
-    server.sendmail(sender_email, recipient_email, msg.as_string())
-    # Close the connection
-    server.quit()
\ No newline at end of file
+    # Queued: delivered by the mailer workers, the request does not wait for SMTP
+    mailer.send(verification_message(recipient_email, code))
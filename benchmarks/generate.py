@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta
+import hashlib, random, secrets
+
+# -------------------------------------------------
+# Synthetic database
+# -------------------------------------------------
+# Fills the storage backend of the current working directory (database/ or the
+# configured SQLite file) with users, approved sessions, report days and
+# attachments. Must run after chdir into the benchmark directory: api.* reads
+# config.json and database/ relative to it.
+
+TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. "
+
+
+def _api_key():
+    return secrets.token_hex(24).upper()
+
+def generate(users=20, days=30, reports_per_day=3, attachments_per_report=1, attachment_bytes=64 * 1024, seed=0):
+    """Write the synthetic collections; returns a summary with the ids the benchmark needs."""
+    from api import blobs, storage
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+    users_data, sessions = {}, {}
+    record_id = file_id = 0
+    report_ids, file_paths = [], []
+
+    # User 0 is the administrator, the others are regular users
+    for user_id in range(users + 1):
+        api_key = _api_key()
+        users_data[str(user_id)] = {
+            "id": user_id, "username": f"user{user_id}" if user_id else "admin", "fullname": f"Bench User {user_id}",
+            "role": "User" if user_id else "Administrator", "phone": "000000000", "email": f"user{user_id}@bench.invalid",
+            "api_key": api_key, "created_at": "01-01-2025 00:00:00",
+        }
+        sessions[api_key] = {"credentials": {"login_param": "username", "value": users_data[str(user_id)]["username"]}, "user_id": user_id,
+                             "code": None, "approved": True, "start_time": now, "api_key": api_key}
+
+    for user_id in range(1, users + 1):
+        reports = storage.new_user_reports(user_id)
+        for offset in range(days):
+            day = (today - timedelta(days=offset)).strftime("%d-%m-%Y")
+            day_report = reports["items"][day] = storage.new_day_report(day)
+            # Days older than the auto-validation threshold are already validated
+            if offset >= 30:
+                day_report["validated"], day_report["validated_by"] = True, 0
+            for _ in range(reports_per_day):
+                record_id += 1
+                files = []
+                for _ in range(attachments_per_report):
+                    file_id += 1
+                    content = rng.randbytes(attachment_bytes)
+                    sha256 = hashlib.sha256(content).hexdigest()
+                    staged = blobs.blob_path(sha256, "bin").with_name(f".{sha256}.part")
+                    staged.parent.mkdir(parents=True, exist_ok=True)
+                    staged.write_bytes(content)
+                    path = blobs.add_reference(sha256, file_id, staged, "bin").as_posix()
+                    files.append({"id": file_id, "name": f"attachment-{file_id}.bin", "type": "application/octet-stream", "path": path, "size": attachment_bytes, "sha256": sha256})
+                    file_paths.append(path)
+                text = "<p>" + TEXT * rng.randint(1, 8) + "</p>"
+                day_report["records"].append({
+                    "id": record_id, "title": f"Report {record_id}", "content": {"text": text, "files": files, "extra_fields": [{"key": "client", "value": f"client-{rng.randint(1, 50)}"}]},
+                    "user_id": user_id, "day": day, "created_at": "08:00:00", "last_edit_at": "",
+                })
+                report_ids.append(record_id)
+        storage.write(reports, "reports", user_id)
+
+    storage.write(users_data, "users")
+    storage.write(sessions, "sessions")
+    storage.write({"last_user_id": users, "last_post_id": 0, "last_record_id": record_id, "last_file_id": file_id}, "tracker")
+    storage.write([], "posts")
+    return {
+        "admin_key": users_data["0"]["api_key"],
+        "user_keys": {user_id: users_data[str(user_id)]["api_key"] for user_id in range(1, users + 1)},
+        "usernames": [users_data[str(user_id)]["username"] for user_id in range(1, users + 1)],
+        "report_ids": report_ids,
+        "file_paths": file_paths,
+        "records": record_id,
+        "files": file_id,
+    }
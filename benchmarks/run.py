@@ -0,0 +1,259 @@
+"""Benchmark the Reports API in-process.
+
+    python -m benchmarks.run [--users 20] [--days 30] [--reports-per-day 3]
+                             [--attachment-bytes 65536] [--requests 200]
+                             [--concurrency 8] [--backend json|sqlite]
+                             [--output benchmark-results.json] [--compare old.json]
+
+A synthetic database is generated in a temporary directory (or --workdir),
+then every scenario is driven through the ASGI app with httpx, without a
+network or a server. Mails go to the in-memory transport. Results (throughput
+and latency percentiles per scenario) are printed and written as JSON;
+--compare prints the change against a previous result file.
+"""
+from pathlib import Path
+import argparse, asyncio, json, os, platform, random, shutil, statistics, subprocess, sys, tempfile, time
+
+from benchmarks.generate import generate
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+SCENARIOS = ("login", "add_report", "edit_report", "delete_report", "list_users", "list_reports", "list_page", "single_report", "search", "download_file")
+SEARCHES = ("dolor", "client 7", "magna aliq*", "report 12*", "tempor labore", "nothing")
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+def summarize(latencies, elapsed, errors):
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(latencies), "errors": errors, "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(ms), 3), "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3), "p99_ms": round(percentile(ms, 99), 3), "max_ms": round(max(ms), 3),
+    }
+
+def prepare_workdir(workdir, backend):
+    """Benchmark directory with its own config.json, interface/ and (empty) database/."""
+    workdir = Path(workdir)
+    if workdir.joinpath("database").exists():
+        shutil.rmtree(workdir.joinpath("database"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    config = json.loads(REPO_DIR.joinpath("config.json").read_text(encoding="utf-8"))
+    config["storage"] = (config.get("storage") or {}) | {"backend": backend}
+    config["mail"] = (config.get("mail") or {}) | {"backend": "memory"}
+    config["validation"] = (config.get("validation") or {}) | {"interval_seconds": 24 * 3600}
+    workdir.joinpath("config.json").write_text(json.dumps(config, indent=4), encoding="utf-8")
+    if not workdir.joinpath("interface").exists():
+        shutil.copytree(REPO_DIR.joinpath("interface"), workdir.joinpath("interface"))
+    workdir.joinpath("database").mkdir()
+    return workdir
+
+
+class Bench:
+    def __init__(self, client, data, args):
+        self.client, self.data, self.args = client, data, args
+        self.rng = random.Random(args.seed)
+        self.user_ids = list(data["user_keys"])
+        self.added = []  # (user_id, day, report id) created by add_report, edited then deleted
+
+    def user(self):
+        user_id = self.rng.choice(self.user_ids)
+        return user_id, {"x-api-key": self.data["user_keys"][user_id]}
+
+    async def login(self, i):
+        # Each user logs in on its own; a fresh key is issued at every login
+        from api import storage
+        username = self.data["usernames"][i % len(self.data["usernames"])]
+        r = await self.client.post("/api/auth/login", json={"login_param": "username", "value": username})
+        r.raise_for_status()
+        api_key = r.json()["api_key"]
+        code = storage.read("sessions")[api_key]["code"]
+        r = await self.client.post(f"/api/auth/login/verify?code={code}", headers={"x-api-key": api_key})
+        r.raise_for_status()
+        user_id = int(username.removeprefix("user"))
+        self.data["user_keys"][user_id] = storage.read("users")[str(user_id)]["api_key"]
+        return r
+
+    async def add_report(self, i):
+        user_id, headers = self.user()
+        files = [("files", (f"bench-{i}.bin", os.urandom(self.args.attachment_bytes), "application/octet-stream"))] if self.args.attachment_bytes else []
+        r = await self.client.post("/api/reports/add", headers=headers, files=files,
+                                   data={"title": f"Bench {i}", "text": "<p>benchmark</p>", "extra_fields": json.dumps({"client": "bench"})})
+        r.raise_for_status()
+        report = r.json()["report"]
+        self.added.append((user_id, report["day"], report["id"]))
+        return r
+
+    async def edit_report(self, i):
+        user_id, day, report_id = self.added[i % len(self.added)]
+        r = await self.client.patch("/api/reports/edit", headers={"x-api-key": self.data["user_keys"][user_id]},
+                                    data={"id": report_id, "date": day, "title": f"Edited {i}", "text": "<p>edited</p>"})
+        r.raise_for_status()
+        return r
+
+    async def delete_report(self, i):
+        if not self.added:
+            return None
+        user_id, day, report_id = self.added.pop()
+        r = await self.client.delete(f"/api/reports/delete/{day}/{report_id}", headers={"x-api-key": self.data["user_keys"][user_id]})
+        r.raise_for_status()
+        return r
+
+    async def list_users(self, i):
+        r = await self.client.get("/api/users", headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def list_reports(self, i):
+        r = await self.client.get("/api/reports", headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def list_page(self, i):
+        r = await self.client.get("/api/reports?limit=100", headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def single_report(self, i):
+        report_id = self.rng.choice(self.data["report_ids"])
+        r = await self.client.get(f"/api/reports/single?id={report_id}", headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def search(self, i):
+        r = await self.client.get("/api/reports/search", params={"q": self.rng.choice(SEARCHES)}, headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def download_file(self, i):
+        path = self.rng.choice(self.data["file_paths"]).removeprefix("database/files/")
+        r = await self.client.get(f"/api/files/{path}", headers={"x-api-key": self.data["admin_key"]})
+        r.raise_for_status()
+        return r
+
+    async def run(self, scenario, count, concurrency):
+        operation = getattr(self, scenario)
+        # Logins of one user must not interleave: their keys would be rotated under each other
+        if scenario == "login":
+            concurrency = min(concurrency, len(self.data["usernames"]))
+        semaphore, latencies, errors, first_error = asyncio.Semaphore(concurrency), [], 0, None
+
+        async def one(i):
+            nonlocal errors, first_error
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await operation(i)
+                except Exception as e:
+                    errors += 1
+                    first_error = first_error or f"{e!r} {getattr(getattr(e, 'response', None), 'text', '')[:200]}".strip()
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if scenario == "login":
+            # Batches of distinct users
+            for batch in range(0, count, concurrency):
+                await asyncio.gather(*(one(i) for i in range(batch, min(count, batch + concurrency))))
+        else:
+            await asyncio.gather(*(one(i) for i in range(count)))
+        summary = summarize(latencies or [0.0], time.perf_counter() - start, errors)
+        if first_error:
+            summary["first_error"] = first_error
+        return summary
+
+
+async def benchmark(args, data):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with main.lifespan(main.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        bench = Bench(client, data, args)
+        for scenario in args.scenarios:
+            results[scenario] = await bench.run(scenario, args.requests, args.concurrency)
+            print(f"{scenario:<16} {results[scenario]['throughput_rps']:>10} req/s  p50 {results[scenario]['p50_ms']:>9} ms  "
+                  f"p95 {results[scenario]['p95_ms']:>9} ms  p99 {results[scenario]['p99_ms']:>9} ms  errors {results[scenario]['errors']}", file=sys.stderr)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, previous, threshold):
+    """Print the change of every scenario against a previous result file; returns the regressions."""
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        if (before := previous.get("scenarios", {}).get(scenario)) is None:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if not before.get(metric) or current.get(metric) is None:
+                continue
+            change = (current[metric] - before[metric]) / before[metric]
+            # Lower is better for latencies, higher for throughput
+            worse = -change if metric == "throughput_rps" else change
+            flag = " REGRESSION" if worse > threshold else ""
+            if flag:
+                regressions.append((scenario, metric))
+            print(f"{scenario:<16} {metric:<15} {before[metric]:>10} -> {current[metric]:>10} ({change:+.1%}){flag}", file=sys.stderr)
+    return regressions
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Reports API in-process on a synthetic database.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30, help="report days per user")
+    parser.add_argument("--reports-per-day", type=int, default=3)
+    parser.add_argument("--attachments-per-report", type=int, default=1)
+    parser.add_argument("--attachment-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="directory for the synthetic database (default: a temporary one, deleted afterwards)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+    if "delete_report" in args.scenarios or "edit_report" in args.scenarios:
+        # Edits and deletions work on the reports added by the run
+        args.scenarios = ["add_report"] + [s for s in args.scenarios if s != "add_report"]
+
+    output = Path(args.output).resolve()
+    previous = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    workdir = prepare_workdir(args.workdir or tempfile.mkdtemp(prefix="reports-bench-"), args.backend)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_DIR))
+    try:
+        start = time.perf_counter()
+        data = generate(args.users, args.days, args.reports_per_day, args.attachments_per_report, args.attachment_bytes, args.seed)
+        print(f"Generated {args.users} users, {data['records']} reports and {data['files']} attachments in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        scenarios = asyncio.run(benchmark(args, data))
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "workdir")},
+        "scenarios": scenarios,
+    }
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {output}", file=sys.stderr)
+    if previous is not None and compare(results, previous, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
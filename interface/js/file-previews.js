@@ -15,10 +15,13 @@
                 const subpath = imgEl.getAttribute('data-filepath');
                 if (!subpath) continue;
                 const url = getApiUrl('/files/' + encodeURIComponent(subpath));
+                // Server-side thumbnail (data-size overrides the default); the original if there is none
+                const size = imgEl.getAttribute('data-size') || 'small';
                 try {
                     const headers = { 'x-api-key': apiKey };
                     if (authToken) headers['Authorization'] = 'Bearer ' + authToken;
-                    const res = await fetch(url, { method: 'GET', headers });
+                    let res = await fetch(url + '?size=' + encodeURIComponent(size), { method: 'GET', headers });
+                    if (!res.ok) res = await fetch(url, { method: 'GET', headers });
                     if (!res.ok) continue;
                     const blob = await res.blob();
                     const objectUrl = URL.createObjectURL(blob);
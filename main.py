@@ -1,16 +1,85 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 
 from api.router import router
 from api.models import *
 from api.utilities import *
+from api import auto_validation, blobs, previews, report_index, report_search, report_stats, sessions, storage
+from api.mailer import mailer
+from api.blocking import monitor_event_loop, run_blocking
+from api.compression import CompressionMiddleware
+from api.metrics import MetricsMiddleware
+from api.static_assets import StaticAssets
+from api.uploads import UploadLimitMiddleware
 
-import json
+import asyncio, json, logging, multiprocessing
 appConfig = json.load(open("config.json", "r", encoding="utf-8"))
 
-app = FastAPI(title="Report API", version="1.0.0")
+def configure_logging():
+    logging.basicConfig(
+        filename="app.log",
+        level=(appConfig.get("logging") or {}).get("level", "INFO"),
+        format="%(asctime)s - %(process)d - %(name)s - %(levelname)s - %(message)s"
+    )
+
+async def collect_blobs_periodically():
+    while True:
+        await asyncio.sleep(blobs.GC_INTERVAL_SECONDS)
+        try:
+            await run_blocking(blobs.collect_garbage)
+        except Exception:
+            logging.getLogger("api.blobs").exception("Blob garbage collection failed")
+
+async def validate_reports_periodically():
+    while True:
+        try:
+            await run_blocking(auto_validation.run)
+        except Exception:
+            logging.getLogger("api.auto_validation").exception("Automatic validation failed")
+        await asyncio.sleep(auto_validation.INTERVAL_SECONDS)
+
+async def purge_sessions_periodically():
+    while True:
+        await asyncio.sleep(sessions.PURGE_INTERVAL_SECONDS)
+        try:
+            await run_blocking(sessions.purge)
+        except Exception:
+            logging.getLogger("api.sessions").exception("Session purge failed")
+
+async def compact_journals_periodically():
+    while True:
+        await asyncio.sleep(storage.COMPACT_INTERVAL_SECONDS)
+        try:
+            await run_blocking(storage.compact_all)
+        except Exception:
+            logging.getLogger("api.storage").exception("Journal compaction failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if multiprocessing.parent_process() is not None:
+        # Worker process spawned by uvicorn: it does not run the __main__ block
+        configure_logging()
+    static_assets.load()
+    report_index.rebuild()
+    report_stats.rebuild()
+    report_search.rebuild()
+    auto_validation.rebuild()
+    background_tasks = [
+        asyncio.create_task(collect_blobs_periodically()),
+        asyncio.create_task(validate_reports_periodically()),
+        asyncio.create_task(purge_sessions_periodically()),
+        asyncio.create_task(compact_journals_periodically()),
+        asyncio.create_task(monitor_event_loop()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    previews.shutdown()
+    # Deliver the verification codes still queued before exiting
+    await run_blocking(mailer.close)
+
+app = FastAPI(title="Report API", version="1.0.0", lifespan=lifespan)
 origins = [
     "https://srvgc.tailcca3c2.ts.net",
     "http://127.0.0.1:5050",
@@ -23,6 +92,10 @@ origins = [
     "http://localhost",
     "http://srvgc:5050"
 ]
+# Innermost: compresses what the routes return
+app.add_middleware(CompressionMiddleware)
+# Oversized uploads are refused before their body is read (inside CORS, so browsers can read the 413)
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -30,27 +103,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: times the whole request, CORS included
+app.add_middleware(MetricsMiddleware)
 
 # API Router
-app.include_router(router, prefix="/api")
+app.include_router(router)
 
-# Web app
-app.mount("/", StaticFiles(directory="interface", html=True), "static")
+# Web app: precompressed, with content-hashed asset URLs (built in the lifespan, not at
+# import: preview pool processes import this module again)
+static_assets = StaticAssets("interface")
+app.mount("/", static_assets, "static")
 
 @app.exception_handler(404)
 async def custom_404_handler(request, exc):
-    return FileResponse("interface/index.html")
+    return static_assets.response("index.html", request.scope)
 
 
 if __name__ == "__main__":
     import uvicorn
-    import uvicorn
-    import logging
-    logging.basicConfig(
-        filename="app.log",
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    uvicorn.run(app, host="0.0.0.0", port=appConfig.get("port"), log_config=None)
-    # validate_reports()
+    configure_logging()
+    # Several workers share the database through the storage layer's cross-process locks
+    workers = appConfig.get("workers", 1)
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=appConfig.get("port"), workers=workers, log_config=None)
 